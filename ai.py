@@ -1,68 +1,539 @@
-import joblib
-from time import sleep
-import pandas as pd
-
-class DiseasePredictor:
-    def __init__(self):
-        try:
-            self.model = joblib.load('aimodels/disease_predictor.joblib')
-            self.feature_encoders = joblib.load('aimodels/feature_encoders.joblib')
-            self.label_encoder_y = joblib.load('aimodels/label_encoder_y.joblib')
-            print("All files loaded successfully!")
-        except FileNotFoundError as e:
-            print(f"Error: {e}. Please check the file paths.")
-            raise
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            raise
-    
-    def predict_disease(self, new_data):
-        input_df = pd.DataFrame([new_data])
-        
-        for col, encoder in self.feature_encoders.items():
-            if col in input_df.columns:
-                input_df[col] = input_df[col].map(lambda x: x if x in encoder.classes_ else 'UNKNOWN')
-                input_df[col] = encoder.transform(input_df[col])
-        
-        prediction = self.model.predict(input_df)
-        
-        # Simulate loading (optional - you might want to remove this in GUI)
-
-        return self.label_encoder_y.inverse_transform(prediction)[0]
-
-# This part will only run if the script is executed directly (not when imported)
-if __name__ == "__main__":
-    predictor = DiseasePredictor()
-    
-    input_fever = input("Enter Fever (Yes/No): ")
-    input_cough = input("Enter Cough (Yes/No): ")
-    input_fatigue = input("Enter Fatigue (Yes/No): ")
-    input_difficulty_breathing = input("Enter Difficulty Breathing (Yes/No): ")
-    input_headache = input("Enter Headache (Yes/No): ")
-    input_rash = input("Enter Rash (Yes/No): ")
-    input_nausea = input("Enter Nausea (Yes/No): ")
-    input_joint_pain = input("Enter Joint Pain (Yes/No): ")
-    input_weight_change = input("Enter Weight Change (Yes/No): ")
-    input_age = int(input("Enter Age: "))
-    input_gender = input("Enter Gender (Male/Female): ")
-    input_blood_pressure = input("Enter Blood Pressure (Low/Medium/High): ")
-    input_cholesterol_level = input("Enter Cholesterol Level (Low/Medium/High): ")
-
-    new_patient = {
-        'Fever': input_fever,
-        'Cough': input_cough,
-        'Fatigue': input_fatigue,
-        'Difficulty Breathing': input_difficulty_breathing,
-        'Headache': input_headache,
-        'Rash': input_rash,
-        'Nausea': input_nausea,
-        'Joint Pain': input_joint_pain,
-        'Weight Change': input_weight_change,
-        'Age': input_age,
-        'Gender': input_gender,
-        'Blood Pressure': input_blood_pressure,
-        'Cholesterol Level': input_cholesterol_level
-    }
-
-    print(f"Symptoms and Data Collected: {new_patient}")
-    print(f"Predicted Disease: {predictor.predict_disease(new_patient)}")
\ No newline at end of file
+import os
+import sys
+import json
+import time
+import functools
+import numpy as np
+import streamlit as st
+# joblib, pandas and sklearn are imported where they are used: the single-row UI path
+# never touches pandas, and none of them should be paid for before a prediction is made.
+
+MODEL_DIR = os.getenv("MODEL_DIR", "aimodels")
+# "joblib" unpickles the forest into this process's heap; "mmap" maps the flattened
+# arrays written by `python model_tools.py convert-mmap` so workers share one copy;
+# "lookup" maps the per-input answers written by `python model_tools.py distill-lookup`
+# and needs neither the forest nor sklearn.
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "joblib")
+FLAT_FOREST_DIR = 'disease_predictor_arrays'
+LOOKUP_DIR = 'disease_lookup'
+
+# Model input columns, in the order predict_disease has always built them.
+FEATURE_COLUMNS = [
+    'Fever', 'Cough', 'Fatigue', 'Difficulty Breathing', 'Headache', 'Rash', 'Nausea',
+    'Joint Pain', 'Weight Change', 'Age', 'Gender', 'Blood Pressure', 'Cholesterol Level'
+]
+
+# Every value predict_disease_ui can submit; PredictionTable precomputes this whole grid.
+INPUT_GRID = {
+    **{col: ["No", "Yes"] for col in FEATURE_COLUMNS[:9]},
+    'Age': list(range(20, 81)),
+    'Gender': ["Male", "Female"],
+    'Blood Pressure': ["Normal", "Low", "High"],
+    'Cholesterol Level': ["Normal", "Low", "High"],
+}
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 4096))
+PRECOMPUTE_PREDICTIONS = os.getenv("PRECOMPUTE_PREDICTIONS", "0") == "1"
+# Diseases per grid point the precomputed table keeps for predict_topk; larger differentials run the model.
+PRECOMPUTE_TOP_K = int(os.getenv("PRECOMPUTE_TOP_K", 5))
+
+def _current_rss_bytes():
+    """Resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class FlatForest:
+    """A fitted RandomForestClassifier flattened into plain NumPy node arrays.
+
+    sklearn copies every tree into private memory when it is unpickled, even with
+    joblib's mmap_mode. Here all trees are concatenated into a handful of .npy files
+    that are opened with np.load(mmap_mode='r'), so the node and leaf-value arrays
+    stay in the shared page cache and several worker processes map the same pages.
+    predict/predict_proba reproduce the forest's results exactly.
+    """
+    ARRAYS = ('roots', 'children_left', 'children_right', 'feature', 'threshold', 'value', 'classes')
+
+    def __init__(self, path, mmap_mode='r'):
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode))
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        self.max_depth = meta['max_depth']
+        self.feature_names_in_ = np.array(meta['feature_names']) if meta['feature_names'] else None
+        self.n_features_in_ = meta['n_features']
+        self.classes_ = np.asarray(self.classes)
+
+    @staticmethod
+    def save(model, path):
+        """Write the trees of a fitted RandomForestClassifier as flat arrays under `path`."""
+        os.makedirs(path, exist_ok=True)
+        roots, lefts, rights, features, thresholds, values = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            # Leaves point at themselves so every tree can be walked for the same number of steps.
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            values.append(tree.value[:, 0, :])
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        arrays = {
+            'roots': np.array(roots, dtype=np.int64),
+            'children_left': np.concatenate(lefts).astype(np.int64),
+            'children_right': np.concatenate(rights).astype(np.int64),
+            'feature': np.concatenate(features).astype(np.int64),
+            'threshold': np.concatenate(thresholds).astype(np.float64),
+            'value': np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            'classes': np.asarray(model.classes_),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f'{name}.npy'), array)
+        feature_names = getattr(model, 'feature_names_in_', None)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({
+                "max_depth": int(max_depth),
+                "n_features": int(model.n_features_in_),
+                "feature_names": [str(name) for name in feature_names] if feature_names is not None else None,
+            }, f, indent=2)
+
+    def _as_array(self, X):
+        if hasattr(X, 'columns') and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        # Same dtype as sklearn's tree input validation, so thresholds compare identically.
+        return np.asarray(X, dtype=np.float32)
+
+    def apply(self, X):
+        X = self._as_array(X)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]), dtype=np.float64)
+        # Accumulate tree by tree, in the same order as RandomForestClassifier.predict_proba.
+        for tree_idx in range(leaves.shape[1]):
+            proba += self.value[leaves[:, tree_idx]]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+class FeatureEncoder:
+    """Encodes patient records with class-to-index tables built once from the fitted LabelEncoders.
+
+    Matches the original per-column `LabelEncoder.transform` path: a value the encoder
+    never saw is encoded as 'UNKNOWN', and it is an error if 'UNKNOWN' was not fitted either.
+    """
+    def __init__(self, feature_encoders, feature_names):
+        self.feature_names = list(feature_names)
+        self.lookups = {
+            col: {cls: idx for idx, cls in enumerate(encoder.classes_)}
+            for col, encoder in feature_encoders.items()
+        }
+        self._row_plan = [(idx, col, self.lookups.get(col)) for idx, col in enumerate(self.feature_names)]
+
+    def encode_value(self, col, value):
+        """The model input for a single column value, exactly as encode_row encodes it."""
+        lookup = self.lookups.get(col)
+        if lookup is not None:
+            code = lookup.get(value, lookup.get('UNKNOWN'))
+            if code is None:
+                raise ValueError(f"{col} contains previously unseen labels: [{value!r}]")
+            value = code
+        return float(np.float32(value))
+
+    def encode_row(self, record):
+        """Encode one patient dict straight into a (1, n_features) float32 row, without pandas."""
+        row = np.empty((1, len(self._row_plan)), dtype=np.float32)
+        for idx, col, lookup in self._row_plan:
+            value = record[col]
+            if lookup is not None:
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup.get('UNKNOWN')
+                    if code is None:
+                        raise ValueError(f"{col} contains previously unseen labels: [{value!r}]")
+                value = code
+            row[0, idx] = value
+        return row
+
+    def encode_frame(self, frame):
+        """Encode every row of `frame` at once, returning the model's input DataFrame."""
+        import pandas as pd
+        columns = {}
+        for col in self.feature_names:
+            values = frame[col]
+            lookup = self.lookups.get(col)
+            if lookup is not None:
+                codes = values.map(lookup)
+                unseen = codes.isna()
+                if unseen.any():
+                    if 'UNKNOWN' not in lookup:
+                        raise ValueError(f"{col} contains previously unseen labels: {sorted(set(values[unseen]))}")
+                    codes = codes.fillna(lookup['UNKNOWN'])
+                values = codes.astype(np.int64)
+            columns[col] = values.to_numpy()
+        return pd.DataFrame(columns, columns=self.feature_names)
+
+class PredictionTable:
+    """Model predictions for every point of INPUT_GRID, stored densely.
+
+    Each feature's distinct encoded grid values get a position along one axis, and a
+    prediction key's flat index is the mixed-radix number formed by its positions.
+    The ~560k grid predictions fit in an int16 array of about 1 MB; the top_k
+    (predict_proba column, probability) pairs kept for the differential add about
+    14 MB at top_k=5.
+    """
+    def __init__(self, encoder, grid=INPUT_GRID):
+        axes = [sorted({encoder.encode_value(col, value) for value in grid[col]}) for col in encoder.feature_names]
+        self.positions = [{value: pos for pos, value in enumerate(axis)} for axis in axes]
+        self.shape = tuple(len(axis) for axis in axes)
+        self.strides = [int(np.prod(self.shape[idx + 1:])) for idx in range(len(axes))]
+        self.axes = axes
+        self.labels = self.topk_columns = self.topk_proba = None
+        self.n_classes = 0
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.labels, self.topk_columns, self.topk_proba) if array is not None)
+
+    def rows(self, start, stop):
+        """Encoded model input rows for flat indices [start, stop)."""
+        coords = np.unravel_index(np.arange(start, stop), self.shape)
+        return np.column_stack([np.asarray(axis, dtype=np.float32)[c] for axis, c in zip(self.axes, coords)])
+
+    def fill(self, proba_rows, classes, top_k=5, chunk_size=50000):
+        """Evaluate `proba_rows` (predict_proba of encoded rows, columns in `classes` order) on the whole grid."""
+        classes = np.asarray(classes)
+        top_k = min(top_k, len(classes))
+        labels = np.empty(len(self), dtype=np.int16)
+        topk_columns = np.empty((len(self), top_k), dtype=np.min_scalar_type(len(classes) - 1))
+        topk_proba = np.empty((len(self), top_k), dtype=np.float32)
+        for start in range(0, len(self), chunk_size):
+            stop = min(start + chunk_size, len(self))
+            proba = proba_rows(self.rows(start, stop))
+            labels[start:stop] = classes.take(np.argmax(proba, axis=1))
+            # Stable, so the first column is argmax's (the label) even when probabilities tie.
+            order = np.argsort(-proba, axis=1, kind='stable')[:, :top_k]
+            topk_columns[start:stop] = order
+            topk_proba[start:stop] = np.take_along_axis(proba, order, axis=1)
+        self.labels, self.topk_columns, self.topk_proba = labels, topk_columns, topk_proba
+        self.n_classes = len(classes)
+
+    def index(self, key):
+        """The flat index of `key`, or None when the key lies outside the grid."""
+        index = 0
+        for value, positions, stride in zip(key, self.positions, self.strides):
+            pos = positions.get(value)
+            if pos is None:
+                return None
+            index += pos * stride
+        return index
+
+    def get(self, key):
+        """The precomputed label code for `key`, or None when the key lies outside the grid."""
+        index = self.index(key)
+        return None if index is None else int(self.labels[index])
+
+    def topk(self, key, k):
+        """The `k` most probable (predict_proba column, probability) pairs for `key`, best first;
+        None when the key lies outside the grid or more than the stored top_k are asked for."""
+        stored = self.topk_columns.shape[1]
+        if k > stored and stored < self.n_classes:
+            return None
+        index = self.index(key)
+        if index is None:
+            return None
+        return list(zip(self.topk_columns[index, :k].tolist(), self.topk_proba[index, :k].tolist()))
+
+class StoredLabelEncoder:
+    """The parts of a fitted LabelEncoder the predictor uses, rebuilt from its classes without sklearn."""
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+    def transform(self, values):
+        values = np.asarray(values)
+        codes = np.searchsorted(self.classes_, values)
+        if np.any(codes >= len(self.classes_)) or np.any(self.classes_[np.minimum(codes, len(self.classes_) - 1)] != values):
+            raise ValueError(f"y contains previously unseen labels: {sorted(set(values.tolist()) - set(self.classes_.tolist()))}")
+        return codes
+
+    def inverse_transform(self, codes):
+        return self.classes_[np.asarray(codes)]
+
+class LookupModel:
+    """A model distilled into its answers for every point of INPUT_GRID.
+
+    For each grid point (indexed as in PredictionTable) the artifact keeps the predicted
+    class and the top_k classes with their probabilities, all as .npy files opened with
+    mmap_mode='r'. meta.json carries the grid axes and the classes of every encoder, so
+    loading needs neither joblib nor sklearn. predict() reproduces the source model
+    exactly on the grid; predict_proba() is exact for the top_k classes and 0 elsewhere.
+    Rows outside the grid raise ValueError.
+    """
+    ARRAYS = ('labels', 'topk_classes', 'topk_proba')
+
+    def __init__(self, path, mmap_mode='r'):
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode))
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        self.feature_names_in_ = np.array(meta['feature_names'])
+        self.n_features_in_ = len(meta['feature_names'])
+        self.classes_ = np.asarray(meta['classes'])
+        self.axes = [np.asarray(axis, dtype=np.float32) for axis in meta['axes']]
+        self.strides = np.array([int(np.prod([len(axis) for axis in self.axes[idx + 1:]])) for idx in range(len(self.axes))])
+        # Same mixed-radix index as PredictionTable.get, for the single rows the UI sends.
+        self.positions = [{float(value): pos for pos, value in enumerate(axis)} for axis in self.axes]
+        self._row_plan = list(zip(self.positions, self.strides.tolist()))
+        self.feature_encoders = {col: StoredLabelEncoder(classes) for col, classes in meta['feature_classes'].items()}
+        self.label_encoder = StoredLabelEncoder(meta['label_classes'])
+
+    @staticmethod
+    def save(predictor, path, top_k=5, chunk_size=50000):
+        """Evaluate `predictor` on the whole of INPUT_GRID and write the answers under `path`."""
+        os.makedirs(path, exist_ok=True)
+        table = PredictionTable(predictor.encoder)
+        table.fill(predictor._proba_rows, predictor.model.classes_, top_k, chunk_size)
+        top_k = table.topk_columns.shape[1]
+        # The artifact's labels are predict_proba columns: the first of each top-k row.
+        labels = np.ascontiguousarray(table.topk_columns[:, 0])
+        for name, array in (('labels', labels), ('topk_classes', table.topk_columns), ('topk_proba', table.topk_proba)):
+            np.save(os.path.join(path, f'{name}.npy'), array)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({
+                "feature_names": predictor.encoder.feature_names,
+                "axes": [[float(value) for value in axis] for axis in table.axes],
+                "classes": np.asarray(predictor.model.classes_).tolist(),
+                "feature_classes": {col: np.asarray(encoder.classes_).tolist() for col, encoder in predictor.feature_encoders.items()},
+                "label_classes": np.asarray(predictor.label_encoder_y.classes_).tolist(),
+                "top_k": top_k,
+            }, f, indent=2)
+
+    def _index(self, X):
+        if hasattr(X, 'columns'):
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape[0] == 1:
+            index = 0
+            for col, (value, (positions, stride)) in enumerate(zip(X[0].tolist(), self._row_plan)):
+                pos = positions.get(value)
+                if pos is None:
+                    raise ValueError(f"{self.feature_names_in_[col]} has values outside the lookup grid; use the joblib or mmap model")
+                index += pos * stride
+            return np.array([index])
+        index = np.zeros(X.shape[0], dtype=np.int64)
+        for col, (axis, stride) in enumerate(zip(self.axes, self.strides)):
+            pos = np.minimum(np.searchsorted(axis, X[:, col]), len(axis) - 1)
+            if np.any(axis[pos] != X[:, col]):
+                raise ValueError(f"{self.feature_names_in_[col]} has values outside the lookup grid; use the joblib or mmap model")
+            index += pos * stride
+        return index
+
+    def predict_proba(self, X):
+        index = self._index(X)
+        proba = np.zeros((len(index), len(self.classes_)), dtype=np.float64)
+        np.put_along_axis(proba, self.topk_classes[index].astype(np.int64), self.topk_proba[index], axis=1)
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(self.labels[self._index(X)].astype(np.int64), axis=0)
+
+class DiseasePredictor:
+    def __init__(self, model_dir=MODEL_DIR, model_format=MODEL_FORMAT):
+        rss_before = _current_rss_bytes()
+        start = time.perf_counter()
+        try:
+            if model_format == 'lookup':
+                self.model = LookupModel(os.path.join(model_dir, LOOKUP_DIR))
+                self.feature_encoders = self.model.feature_encoders
+                self.label_encoder_y = self.model.label_encoder
+            else:
+                import joblib
+                if model_format == 'mmap':
+                    self.model = FlatForest(os.path.join(model_dir, FLAT_FOREST_DIR))
+                else:
+                    self.model = joblib.load(os.path.join(model_dir, 'disease_predictor.joblib'))
+                self.feature_encoders = joblib.load(os.path.join(model_dir, 'feature_encoders.joblib'))
+                self.label_encoder_y = joblib.load(os.path.join(model_dir, 'label_encoder_y.joblib'))
+        except FileNotFoundError as e:
+            print(f"Error: {e}. Please check the file paths.")
+            raise
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            raise
+        feature_names = getattr(self.model, 'feature_names_in_', None)
+        # Disease name of each predict_proba column.
+        self.class_labels = [str(label) for label in self.label_encoder_y.classes_[self.model.classes_]]
+        self.encoder = FeatureEncoder(self.feature_encoders, FEATURE_COLUMNS if feature_names is None else feature_names)
+        self.table = None
+        self.table_hits = 0
+        # Whole probability vectors are cached, so top-1 and top-k share one entry per key.
+        self._cached_proba = functools.lru_cache(maxsize=PREDICTION_CACHE_SIZE)(self._proba_key)
+        rss_after = _current_rss_bytes()
+        self.load_stats = {
+            "model_dir": model_dir,
+            "model_format": model_format,
+            "load_seconds": time.perf_counter() - start,
+            "rss_before_bytes": rss_before,
+            "rss_after_bytes": rss_after,
+            "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            "loaded_at": time.time(),
+        }
+        print(f"All files loaded successfully in {self.load_stats['load_seconds']:.2f}s!")
+    
+    def predict_disease(self, new_data):
+        return self.predict_encoded(self.encode(new_data))
+
+    def encode(self, new_data):
+        """The normalized, hashable model input for one patient dict."""
+        return tuple(self.encoder.encode_row(new_data)[0].tolist())
+
+    def predict_encoded(self, key):
+        table = self.table
+        prediction = table.get(key) if table is not None else None
+        if prediction is None:
+            prediction = self.model.classes_[np.argmax(self._cached_proba(key))]
+        else:
+            self.table_hits += 1
+        return self.label_encoder_y.classes_[prediction]
+
+    def predict_topk(self, new_data, k=5):
+        """The `k` most probable diseases for one patient dict as (disease, probability), best first."""
+        return self.predict_topk_encoded(self.encode(new_data), k)
+
+    def predict_topk_encoded(self, key, k=5):
+        """predict_topk for a key from encode(); diseases the model gives no probability are left out.
+
+        The first entry is always predict_encoded(key)'s disease.
+        """
+        table = self.table
+        topk = table.topk(key, k) if table is not None else None
+        if topk is None:
+            proba = self._cached_proba(key)
+            topk = [(idx, proba[idx]) for idx in np.argsort(-proba, kind='stable')[:k].tolist()]
+        else:
+            self.table_hits += 1
+        return [(self.class_labels[idx], float(p)) for idx, p in topk if p > 0]
+
+    def _proba_key(self, key):
+        proba = self._proba_rows(np.array([key], dtype=np.float32))[0]
+        proba.flags.writeable = False
+        return proba
+
+    def precompute(self):
+        """Evaluate the model once for every INPUT_GRID combination, keeping each prediction and its
+        differential, so UI requests never reach it."""
+        start = time.perf_counter()
+        table = PredictionTable(self.encoder)
+        table.fill(self._proba_rows, self.model.classes_, top_k=PRECOMPUTE_TOP_K)
+        self.table = table
+        self.load_stats["precompute_seconds"] = time.perf_counter() - start
+        print(f"Precomputed {len(table)} predictions in {self.load_stats['precompute_seconds']:.2f}s")
+
+    def cache_stats(self):
+        info = self._cached_proba.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "table_hits": self.table_hits,
+            "table_size": len(self.table) if self.table is not None else 0,
+        }
+
+    def _proba_rows(self, X):
+        """model.predict_proba for already-encoded float32 rows, columns in model.classes_ order.
+
+        sklearn forests are summed here tree by tree exactly as their predict_proba() does, but
+        without its per-call input validation and joblib dispatch, which dominate for one row.
+        """
+        # An sklearn forest can only have been unpickled with sklearn.ensemble imported, so a
+        # model format that never imported it (mmap, lookup) skips the check without importing it.
+        ensemble = sys.modules.get('sklearn.ensemble')
+        if ensemble is not None and isinstance(self.model, (ensemble.RandomForestClassifier, ensemble.ExtraTreesClassifier)) and self.model.n_outputs_ == 1:
+            proba = np.zeros((X.shape[0], len(self.model.classes_)), dtype=np.float64)
+            for estimator in self.model.estimators_:
+                proba += estimator.predict_proba(X, check_input=False)
+            proba /= len(self.model.estimators_)
+            return proba
+        return self.model.predict_proba(X)
+
+    def predict_many(self, records):
+        """Predict a disease for each record (a list of patient dicts or a DataFrame) in one model call."""
+        import pandas as pd
+        frame = records if isinstance(records, pd.DataFrame) else pd.DataFrame.from_records(list(records))
+        if frame.empty:
+            return []
+        predictions = self.model.predict(self.encoder.encode_frame(frame))
+        return self.label_encoder_y.inverse_transform(predictions).tolist()
+
+@st.cache_resource(show_spinner="Loading AI model...")
+def get_predictor():
+    """Process-wide DiseasePredictor, loaded on first use and shared by every session."""
+    predictor = DiseasePredictor()
+    if PRECOMPUTE_PREDICTIONS:
+        predictor.precompute()
+    return predictor
+
+def reload_predictor():
+    """Drop the shared predictor and load it again, e.g. after swapping files in MODEL_DIR."""
+    get_predictor.clear()
+    return get_predictor()
+
+def get_predictor_stats():
+    return get_predictor().load_stats
+
+# This part will only run if the script is executed directly (not when imported)
+if __name__ == "__main__":
+    predictor = DiseasePredictor()
+    
+    input_fever = input("Enter Fever (Yes/No): ")
+    input_cough = input("Enter Cough (Yes/No): ")
+    input_fatigue = input("Enter Fatigue (Yes/No): ")
+    input_difficulty_breathing = input("Enter Difficulty Breathing (Yes/No): ")
+    input_headache = input("Enter Headache (Yes/No): ")
+    input_rash = input("Enter Rash (Yes/No): ")
+    input_nausea = input("Enter Nausea (Yes/No): ")
+    input_joint_pain = input("Enter Joint Pain (Yes/No): ")
+    input_weight_change = input("Enter Weight Change (Yes/No): ")
+    input_age = int(input("Enter Age: "))
+    input_gender = input("Enter Gender (Male/Female): ")
+    input_blood_pressure = input("Enter Blood Pressure (Low/Medium/High): ")
+    input_cholesterol_level = input("Enter Cholesterol Level (Low/Medium/High): ")
+
+    new_patient = {
+        'Fever': input_fever,
+        'Cough': input_cough,
+        'Fatigue': input_fatigue,
+        'Difficulty Breathing': input_difficulty_breathing,
+        'Headache': input_headache,
+        'Rash': input_rash,
+        'Nausea': input_nausea,
+        'Joint Pain': input_joint_pain,
+        'Weight Change': input_weight_change,
+        'Age': input_age,
+        'Gender': input_gender,
+        'Blood Pressure': input_blood_pressure,
+        'Cholesterol Level': input_cholesterol_level
+    }
+
+    print(f"Symptoms and Data Collected: {new_patient}")
+    print(f"Predicted Disease: {predictor.predict_disease(new_patient)}")
@@ -0,0 +1,773 @@
+"""Benchmarks for HeyDoc's hot paths.
+
+    python bench.py predict-batch --rows 20000
+    python bench.py predict-single --rows 2000
+    python bench.py predict-cache --rows 2000
+    python bench.py predict-topk --rows 2000
+    python bench.py pdf --rows 100
+    python bench.py history --rows 500
+    python bench.py history-journal --rows 20000 --sessions 4
+    python bench.py storage --users 100000 --rows 1000000
+    python bench.py json-stress --rows 800 --sessions 8 --users 200
+    python bench.py dashboard --rows 500
+    python bench.py email-outbox --rows 20 --relay-delay 0.2   # needs aiosmtpd
+    python bench.py email-pool --rows 200 --relay-delay 0 --connect-delay 0.05 --pool-size 4
+    python bench.py email-build --rows 500
+    python bench.py import-time
+    python bench.py cold-start --loop-rows 5
+    python bench.py disease-info --rows 72
+    python bench.py search --rows 5000
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from ai import DiseasePredictor, FEATURE_COLUMNS
+from constants import DISEASE_CATALOG
+from storage import get_storage, ShardedHistory, HISTORY_DIR, HISTORY_JOURNAL
+
+DISEASE_INFO = DISEASE_CATALOG.info
+
+YES_NO_COLUMNS = FEATURE_COLUMNS[:9]
+
+def random_patients(n, seed=0):
+    """Patient dicts drawn from the same choices predict_disease_ui offers."""
+    rng = random.Random(seed)
+    patients = []
+    for _ in range(n):
+        patient = {col: rng.choice(["No", "Yes"]) for col in YES_NO_COLUMNS}
+        patient['Age'] = rng.randint(20, 80)
+        patient['Gender'] = rng.choice(["Male", "Female"])
+        patient['Blood Pressure'] = rng.choice(["Normal", "Low", "High"])
+        patient['Cholesterol Level'] = rng.choice(["Normal", "Low", "High"])
+        patients.append(patient)
+    return patients
+
+def bench_predict_batch(args):
+    predictor = DiseasePredictor()
+    patients = random_patients(args.rows)
+
+    sample = patients[:args.loop_rows]
+    start = time.perf_counter()
+    expected = [predictor.predict_disease(p) for p in sample]
+    loop_seconds = (time.perf_counter() - start) / len(sample) * len(patients)
+
+    start = time.perf_counter()
+    predictions = predictor.predict_many(patients)
+    batch_seconds = time.perf_counter() - start
+
+    assert predictions[:len(sample)] == expected, "predict_many disagrees with predict_disease"
+    print(f"predict_disease loop: {loop_seconds:.2f}s for {len(patients)} rows (extrapolated from {len(sample)})")
+    print(f"predict_many:         {batch_seconds:.2f}s for {len(patients)} rows ({len(patients) / batch_seconds:,.0f} rows/s)")
+
+def legacy_predict_disease(predictor, new_data):
+    """predict_disease as it was before the pandas-free fast path, kept as the reference."""
+    input_df = pd.DataFrame([new_data])
+    for col, encoder in predictor.feature_encoders.items():
+        if col in input_df.columns:
+            input_df[col] = input_df[col].map(lambda x: x if x in encoder.classes_ else 'UNKNOWN')
+            input_df[col] = encoder.transform(input_df[col])
+    prediction = predictor.model.predict(input_df)
+    return predictor.label_encoder_y.inverse_transform(prediction)[0]
+
+def time_calls(fn, items):
+    timings = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings) * 1000
+
+def report_latency(label, timings_ms):
+    print(f"{label}: p50 {np.percentile(timings_ms, 50):.3f} ms, p99 {np.percentile(timings_ms, 99):.3f} ms over {len(timings_ms)} calls")
+
+def bench_predict_single(args):
+    predictor = DiseasePredictor()
+    patients = random_patients(args.rows)
+
+    mismatches = [p for p in patients if predictor.predict_disease(p) != legacy_predict_disease(predictor, p)]
+    assert not mismatches, f"fast path disagrees with the DataFrame path on {len(mismatches)} patients"
+    print(f"Fast path matches the DataFrame path on all {len(patients)} patients")
+
+    report_latency("DataFrame path", time_calls(lambda p: legacy_predict_disease(predictor, p), patients))
+    report_latency("encode_row only", time_calls(predictor.encoder.encode_row, patients))
+    report_latency("predict_disease", time_calls(predictor.predict_disease, patients))
+
+def bench_predict_cache(args):
+    predictor = DiseasePredictor()
+    patients = random_patients(args.rows)
+
+    expected = [legacy_predict_disease(predictor, p) for p in patients[:args.loop_rows]]
+    report_latency("cold (cache misses)", time_calls(predictor.predict_disease, patients))
+    report_latency("warm (cache hits)", time_calls(predictor.predict_disease, patients))
+    print(f"LRU cache: {predictor.cache_stats()}")
+
+    predictor.precompute()
+    assert [predictor.predict_disease(p) for p in patients[:args.loop_rows]] == expected, "precomputed table disagrees with the model"
+    report_latency("precomputed table", time_calls(predictor.predict_disease, patients))
+    print(f"Table: {predictor.cache_stats()}, {predictor.table.nbytes / 1024:.0f} KB")
+
+def bench_predict_topk(args):
+    """Top-5 differential vs top-1, cold and warm: both read the same cached probability vector."""
+    predictor = DiseasePredictor()
+    patients = random_patients(args.rows)
+
+    for patient in patients[:args.loop_rows]:
+        proba = predictor.model.predict_proba(predictor.encoder.encode_frame(pd.DataFrame([patient])))[0]
+        expected = predictor.label_encoder_y.inverse_transform(predictor.model.classes_[np.argsort(-proba, kind='stable')[:5]])
+        ranked = predictor.predict_topk(patient, 5)
+        assert [disease for disease, _ in ranked] == list(expected[:len(ranked)]), "top-k disagrees with predict_proba"
+        assert np.allclose([p for _, p in ranked], np.sort(proba)[::-1][:len(ranked)]), "top-k probabilities disagree with predict_proba"
+        assert ranked[0][0] == legacy_predict_disease(predictor, patient), "top-1 of the differential is not the prediction"
+
+    for k in (1, 5):
+        predictor = DiseasePredictor()
+        report_latency(f"top-{k} cold (cache misses)", time_calls(lambda p: predictor.predict_topk(p, k), patients))
+        report_latency(f"top-{k} warm (cache hits)", time_calls(lambda p: predictor.predict_topk(p, k), patients))
+    report_latency("predict_disease after top-5 (shared cache)", time_calls(predictor.predict_disease, patients))
+    print(f"LRU cache: {predictor.cache_stats()}")
+
+    predictor = DiseasePredictor()
+    predictor.precompute()
+    report_latency("top-5 precomputed table", time_calls(lambda p: predictor.predict_topk(p, 5), patients))
+    print(f"Table: {predictor.cache_stats()}")
+
+def bench_pdf(args):
+    from pdf_generator import TREATMENT_REPORT, ILLNESS_REPORT, prerender_reports
+    rng = random.Random(0)
+    diseases = [rng.choice(sorted(DISEASE_INFO)) for _ in range(args.rows)]
+
+    start = time.perf_counter()
+    prerender_reports(DISEASE_INFO)
+    print(f"pre-rendered {len(DISEASE_INFO)} x 2 report bodies in {time.perf_counter() - start:.2f}s")
+
+    for label, template in [("treatment", TREATMENT_REPORT), ("illness", ILLNESS_REPORT)]:
+        for mode, generate in [("full layout", template.render), ("stamped", template.stamp)]:
+            start = time.perf_counter()
+            sizes = [len(generate(d, DISEASE_INFO[d], "bench").getvalue()) for d in diseases]
+            seconds = time.perf_counter() - start
+            print(f"{label} {mode}: {len(diseases) / seconds:.1f} PDFs/s, mean {sum(sizes) / len(sizes) / 1024:.0f} KB")
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def bench_history(args):
+    """Load/save cost of user_history.json with inline base64 PDFs versus blob references."""
+    from pdf_generator import generate_treatment_pdf, generate_illness_pdf
+    import history_manager
+    from blob_store import BLOB_DIR
+    rng = random.Random(0)
+    diseases = sorted(DISEASE_INFO)
+    users = []
+    for u in range(args.users):
+        illnesses = []
+        for i in range(args.rows // args.users):
+            disease = rng.choice(diseases)
+            illnesses.append({
+                "disease": disease,
+                "timestamp": f"2025-01-01 00:00:{i % 60:02d}",
+                "symptoms": ["Fever"],
+                "treatment_pdf": base64.b64encode(generate_treatment_pdf(disease, DISEASE_INFO[disease], f"user{u}").getvalue()).decode('utf-8'),
+                "illness_pdf": base64.b64encode(generate_illness_pdf(disease, DISEASE_INFO[disease], f"user{u}").getvalue()).decode('utf-8'),
+            })
+        users.append({"username": f"user{u}", "illnesses": illnesses})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            _, save_seconds = timed(lambda: json.dump({"users": users}, open('user_history.json', 'w'), indent=2))
+            size = os.path.getsize('user_history.json')
+            _, load_seconds = timed(lambda: json.load(open('user_history.json')))
+            print(f"inline base64: {size / 1024 / 1024:.1f} MB, load {load_seconds * 1000:.0f} ms, save {save_seconds * 1000:.0f} ms")
+
+            get_storage.clear()
+            _, migrate_seconds = timed(history_manager.load_user_history)
+            migrated = history_manager.load_user_history()
+            _, save_seconds = timed(lambda: json.dump({"users": migrated}, open('user_history.json', 'w'), indent=2))
+            size = os.path.getsize('user_history.json')
+            _, load_seconds = timed(lambda: json.load(open('user_history.json')))
+            blobs = [os.path.join(d, f) for d, _, files in os.walk(BLOB_DIR) for f in files]
+            blob_size = sum(os.path.getsize(b) for b in blobs)
+            print(f"blob references: {size / 1024 / 1024:.2f} MB, load {load_seconds * 1000:.0f} ms, save {save_seconds * 1000:.0f} ms "
+                  f"(+ {len(blobs)} blobs, {blob_size / 1024 / 1024:.1f} MB; migration took {migrate_seconds:.2f}s)")
+        finally:
+            os.chdir(cwd)
+
+def _journal_writer(args):
+    """Process worker for bench_history_journal: append `count` entries for `username`."""
+    import history_manager
+    from io import BytesIO
+    username, count = args
+    for i in range(count):
+        history_manager.add_user_illness(username, "Flu", [f"Symptom {i}"], BytesIO(b"t"), BytesIO(b"i"))
+
+def bench_history_journal(args):
+    """Whole-file history rewrites versus per-user journals: write cost, dashboard load, delete, concurrent writers."""
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    import history_manager
+    entry = {"disease": "Flu", "timestamp": "2025-01-01 00:00:00", "symptoms": ["Fever"],
+             "treatment_pdf_blob": "0" * 64, "illness_pdf_blob": "0" * 64}
+    users = [{"username": f"user{u}", "illnesses": [dict(entry) for _ in range(args.rows // args.users)]} for u in range(args.users)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            json.dump({"users": users}, open('user_history.json', 'w'), indent=2)
+
+            def rewrite(_):
+                history = json.load(open('user_history.json'))['users']
+                history[0]['illnesses'].append(dict(entry))
+                json.dump({"users": history}, open('user_history.json', 'w'), indent=2)
+            report_latency(f"whole-file rewrite ({args.rows} entries)", time_calls(rewrite, range(50)))
+            report_latency("whole-file dashboard load", time_calls(
+                lambda _: next(u for u in json.load(open('user_history.json'))['users'] if u['username'] == 'user1'), range(20)))
+
+            get_storage.clear()
+            storage, import_seconds = timed(get_storage)
+            shards = os.listdir(HISTORY_DIR)
+            print(f"split {args.rows + 50} entries into {len(shards)} per-user journals in {import_seconds * 1000:.0f} ms")
+            report_latency("journal append + fsync", time_calls(lambda _: storage.add_illness("user0", entry), range(50)))
+            report_latency("cold dashboard load (one shard)", time_calls(lambda _: ShardedHistory(HISTORY_DIR).get("user1"), range(20)))
+            report_latency("warm dashboard load (incremental)", time_calls(lambda _: storage.get_illnesses("user1"), range(20)))
+
+            writers = [(f"writer{w}", args.rows // args.sessions) for w in range(args.sessions)]
+            with ProcessPoolExecutor(max_workers=args.sessions, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=os.chdir, initargs=(tmp,)) as pool:
+                _, seconds = timed(lambda: list(pool.map(_journal_writer, writers)))
+            for username, count in writers:
+                written = len(history_manager.get_user_illness_history(username))
+                assert written == count, f"{username}: expected {count} entries, found {written}"
+            print(f"{args.sessions} concurrent writer processes: {sum(c for _, c in writers)} appends in {seconds:.2f}s, none lost")
+
+            report_latency("delete one user's history", time_calls(lambda w: storage.delete_history(w[0]), writers))
+            assert not any(storage.get_illnesses(username) for username, _ in writers)
+        finally:
+            os.chdir(cwd)
+
+def bench_storage(args):
+    """JSON vs SQLite storage at args.users users and args.rows history rows, including the one-shot import."""
+    from storage import JsonStorage, SqliteStorage
+    rng = random.Random(0)
+    diseases = sorted(DISEASE_INFO)
+    digest = "0" * 64
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            users = [{"username": f"User{u}", "password": "pw", "email": f"user{u}@example.com", "is_admin": False, "usage_count": 0}
+                     for u in range(args.users)]
+            json.dump({"users": users}, open('users.json', 'w'), indent=2)
+            with open(HISTORY_JOURNAL, 'w') as file:
+                for i in range(args.rows):
+                    illness = {"disease": rng.choice(diseases), "timestamp": "2025-01-01 00:00:00", "symptoms": ["Fever"],
+                               "treatment_pdf_blob": digest, "illness_pdf_blob": digest}
+                    file.write(json.dumps({"op": "add", "username": f"User{rng.randrange(args.users)}", "illness": illness}) + '\n')
+
+            json_storage = JsonStorage()
+            sqlite_storage = SqliteStorage('heydoc.db')
+            counts, import_seconds = timed(lambda: sqlite_storage.import_from(json_storage))
+            print(f"import-json: {counts[0]} users, {counts[2]} history rows in {import_seconds:.1f}s, "
+                  f"{os.path.getsize('heydoc.db') / 1024 / 1024:.0f} MB database")
+
+            names = [f"user{rng.randrange(args.users)}" for _ in range(args.loop_rows)]
+            illness = {"disease": diseases[0], "timestamp": "2025-01-01 00:00:00", "symptoms": ["Fever"],
+                       "treatment_pdf_blob": digest, "illness_pdf_blob": digest}
+            for label, storage in [("json", json_storage), ("sqlite", sqlite_storage)]:
+                # Whole-file rewrites at this size take seconds each, so the JSON backend gets a smaller sample.
+                sample = names[:20] if label == "json" else names
+                report_latency(f"{label} get_user", time_calls(storage.get_user, sample))
+                report_latency(f"{label} user_exists", time_calls(lambda n: storage.user_exists(n, "nobody@example.com"), sample))
+                report_latency(f"{label} increment_usage", time_calls(storage.increment_usage, sample[:5] if label == "json" else sample))
+                report_latency(f"{label} get_illnesses", time_calls(storage.get_illnesses, sample))
+                report_latency(f"{label} add_illness", time_calls(lambda n: storage.add_illness(n, illness), sample))
+        finally:
+            os.chdir(cwd)
+
+def _naive_increment(path):
+    """users.json read-modify-write as the managers did it before file_lock/atomic_write_json."""
+    try:
+        with open(path, 'r') as file:
+            users = json.load(file)['users']
+    except json.JSONDecodeError:
+        return 1
+    users[0]['usage_count'] += 1
+    with open(path, 'w') as file:
+        json.dump({"users": users}, file, indent=2)
+    return 0
+
+def _stress_writer(args):
+    """Process worker for bench_json_stress: a mix of user, pending-user and usage writes."""
+    mode, worker, count = args
+    decode_errors = 0
+    if mode == "naive":
+        for _ in range(count):
+            decode_errors += _naive_increment('users.json')
+        return decode_errors
+    storage = get_storage()
+    for i in range(count):
+        storage.increment_usage("shared")
+        storage.add_user({"username": f"w{worker}-{i}", "password": "pw", "email": f"w{worker}-{i}@example.com",
+                          "is_admin": False, "usage_count": 0})
+        storage.add_pending_user({"username": f"p{worker}-{i}", "password": "pw", "email": f"p{worker}-{i}@example.com",
+                                  "token": "t", "timestamp": "2025-01-01 00:00:00"})
+        if i % 2:
+            storage.remove_pending_user(f"p{worker}-{i}")
+    return decode_errors
+
+def bench_json_stress(args):
+    """Concurrent writer processes against users.json/pending_users.json: naive in-place writes vs transactions."""
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    shared = {"username": "shared", "password": "pw", "email": "shared@example.com", "is_admin": False, "usage_count": 0}
+    padding = [{"username": f"pad{u}", "password": "pw", "email": f"pad{u}@example.com", "is_admin": False, "usage_count": 0}
+               for u in range(args.users)]
+    count = args.rows // args.sessions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for mode in ("naive", "transactional"):
+                for name in ('users.json', 'pending_users.json'):
+                    if os.path.exists(name):
+                        os.unlink(name)
+                json.dump({"users": [dict(shared)] + padding}, open('users.json', 'w'), indent=2)
+                with ProcessPoolExecutor(max_workers=args.sessions, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=os.chdir, initargs=(tmp,)) as pool:
+                    decode_errors, seconds = timed(lambda: sum(pool.map(_stress_writer, [(mode, w, count) for w in range(args.sessions)])))
+                expected = args.sessions * count
+                users = {u['username']: u for u in json.load(open('users.json'))['users']}
+                usage = users['shared']['usage_count']
+                print(f"{mode}: {args.sessions} processes x {count} writes in {seconds:.2f}s, usage_count {usage}/{expected}, "
+                      f"{expected - usage} lost updates, {decode_errors} reads of a torn file")
+                if mode == "transactional":
+                    pending = {u['username'] for u in json.load(open('pending_users.json'))['pending_users']}
+                    missing_users = [f"w{w}-{i}" for w in range(args.sessions) for i in range(count) if f"w{w}-{i}" not in users]
+                    wrong_pending = [f"p{w}-{i}" for w in range(args.sessions) for i in range(count) if (f"p{w}-{i}" in pending) == bool(i % 2)]
+                    assert usage == expected, f"lost {expected - usage} usage increments"
+                    assert not missing_users, f"lost {len(missing_users)} new users"
+                    assert not wrong_pending, f"{len(wrong_pending)} pending users in the wrong state"
+                    assert not decode_errors
+                    leftovers = [name for name in os.listdir('.') if name.endswith('.tmp') or name.startswith('.users.json.')]
+                    assert not leftovers, f"temp files left behind: {leftovers}"
+                    print("transactional: no lost updates, no torn files")
+        finally:
+            os.chdir(cwd)
+
+def bench_dashboard(args):
+    """Rerun time of the logged-in app for a user with args.rows diagnoses, before and after loading one entry's PDFs."""
+    import shutil
+    from streamlit.testing.v1 import AppTest
+    from blob_store import put_blob
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        for name in ('styles.css', 'disease_info.json', 'heydoc-high-resolution-logo.png'):
+            shutil.copy(os.path.join(repo, name), tmp)
+        os.chdir(tmp)
+        try:
+            json.dump({"users": [{"username": "bench", "password": "pw", "email": "bench@example.com", "is_admin": True, "usage_count": 0}]},
+                      open('users.json', 'w'), indent=2)
+            get_storage.clear()
+            storage = get_storage()
+            pdf = put_blob(b"%PDF-1.4 bench")
+            for i in range(args.rows):
+                storage.add_illness("bench", {"disease": "Flu", "timestamp": f"2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}",
+                                              "symptoms": ["Fever"], "treatment_pdf_blob": pdf, "illness_pdf_blob": pdf})
+            _, page_seconds = timed(lambda: storage.get_illness_page("bench", 0, 10))
+            print(f"first history page of {args.rows}: {page_seconds * 1000:.3f} ms")
+
+            at = AppTest.from_file(os.path.join(repo, 'main.py'), default_timeout=120)
+            at.session_state['logged_in'] = True
+            at.session_state['username'] = "bench"
+            _, first_seconds = timed(at.run)
+            runs = [timed(at.run)[1] for _ in range(5)]
+            assert not at.exception, at.exception
+            print(f"app run with {args.rows} diagnoses: first {first_seconds * 1000:.0f} ms, rerun p50 {np.median(runs) * 1000:.0f} ms, "
+                  f"{len(at.expander)} expanders, {len(at.get('download_button'))} download buttons")
+            load = next(b for b in at.button if b.label == "Load Reports")
+            _, load_seconds = timed(lambda: load.click().run())
+            print(f"load reports for one entry: {load_seconds * 1000:.0f} ms, {len(at.get('download_button'))} download buttons")
+        finally:
+            os.chdir(cwd)
+
+class SlowSink:
+    """aiosmtpd handler that accepts every message after `delay` seconds, like a distant relay.
+
+    `connect_delay` is added to each EHLO to stand in for the TLS handshake and
+    login a real relay costs per connection.
+    """
+
+    def __init__(self, delay, connect_delay=0.0):
+        self.delay = delay
+        self.connect_delay = connect_delay
+        self.received = 0
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        import asyncio
+        await asyncio.sleep(self.connect_delay)
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        import asyncio
+        await asyncio.sleep(self.delay)
+        self.received += 1
+        return '250 OK'
+
+def start_smtp_sink(handler, port=0):
+    """Run a local aiosmtpd relay that accepts any login without TLS; returns (controller, port)."""
+    import socket
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+    if not port:
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+    controller = Controller(handler, hostname='127.0.0.1', port=port, auth_require_tls=False,
+                            authenticator=lambda *args: AuthResult(success=True))
+    controller.start()
+    os.environ.update({"SMTP_SERVER": "127.0.0.1", "SMTP_PORT": str(port), "SMTP_STARTTLS": "0",
+                       "SENDER_EMAIL": "heydoc@example.com", "SENDER_PASSWORD": "bench"})
+    return controller, port
+
+def wait_for(condition, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline, "timed out"
+        time.sleep(0.01)
+
+def bench_email_outbox(args):
+    """Time the UI waits for an email sent inline vs queued to the outbox, and check retries after a relay outage."""
+    import threading
+    from io import BytesIO
+    import email_manager
+    from pdf_generator import generate_treatment_pdf, generate_illness_pdf
+    disease = sorted(DISEASE_INFO)[0]
+    treatment = generate_treatment_pdf(disease, DISEASE_INFO[disease], "bench").getvalue()
+    illness = generate_illness_pdf(disease, DISEASE_INFO[disease], "bench").getvalue()
+    send_args = ("patient@example.com", "bench", disease, ["Fever"])
+
+    sink = SlowSink(args.relay_delay)
+    controller, port = start_smtp_sink(sink)
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            report_latency(f"inline send ({args.relay_delay * 1000:.0f} ms relay)", time_calls(
+                lambda _: email_manager.send_diagnosis_email(*send_args, BytesIO(treatment), BytesIO(illness)), range(args.rows)))
+
+            outbox = email_manager.Outbox(tmp)
+            stop = threading.Event()
+            worker = threading.Thread(target=outbox.run, args=(stop,), daemon=True)
+            worker.start()
+            received = sink.received
+            start = time.perf_counter()
+            report_latency("queued (UI acknowledgement)", time_calls(
+                lambda _: outbox.put(email_manager.build_diagnosis_email("heydoc@example.com", *send_args, BytesIO(treatment), BytesIO(illness)), "diagnosis email"),
+                range(args.rows)))
+            wait_for(lambda: sink.received - received == args.rows)
+            print(f"worker drained {args.rows} messages in {time.perf_counter() - start:.2f}s")
+
+            controller.stop()
+            email_manager.OUTBOX_BACKOFF = 0.2
+            for _ in range(args.rows):
+                outbox.put(email_manager.build_confirmation_email("heydoc@example.com", "patient@example.com", "bench", "token"), "confirmation email")
+            wait_for(lambda: any(json.load(open(os.path.join(tmp, name)))["attempts"] for name in outbox.pending()))
+            print(f"relay down: {len(outbox.pending())} messages waiting for retry")
+            received = sink.received
+            controller, _ = start_smtp_sink(sink, port)
+            outbox.wakeup.set()
+            wait_for(lambda: sink.received - received == args.rows and not outbox.pending())
+            print(f"relay back: all {args.rows} retried messages delivered, {len(outbox.failed())} failed")
+            stop.set()
+            outbox.wakeup.set()
+            worker.join()
+        finally:
+            controller.stop()
+
+def bench_email_pool(args):
+    """Messages per second to a local relay with a new connection per message vs pooled connections."""
+    import email_manager
+    sink = SlowSink(args.relay_delay, args.connect_delay)
+    controller, port = start_smtp_sink(sink)
+    msgs = [email_manager.build_confirmation_email("heydoc@example.com", f"user{i}@example.com", f"user{i}", "token")
+            for i in range(args.rows)]
+
+    def run(label, send):
+        received, connections = sink.received, sink.connections
+        _, seconds = timed(send)
+        assert sink.received - received == len(msgs), f"{label}: relay got {sink.received - received} of {len(msgs)}"
+        print(f"{label}: {len(msgs) / seconds:.1f} msgs/s, {sink.connections - connections} connections")
+
+    try:
+        email_manager.SMTP_POOL_SIZE = 0
+        run("new connection per message", lambda: email_manager.send_batch(msgs))
+
+        email_manager.SMTP_POOL_SIZE = args.pool_size
+        email_manager.get_smtp_pool.clear()
+        run(f"send_batch, pool of {args.pool_size}", lambda: email_manager.send_batch(msgs))
+        settings = email_manager.smtp_settings()
+        with ThreadPoolExecutor(max_workers=args.sessions) as sessions:
+            run(f"{args.sessions} concurrent senders, pool of {args.pool_size}",
+                lambda: list(sessions.map(lambda m: email_manager.deliver(m, settings), msgs)))
+
+        # Idle connections are NOOP-checked, and a relay restart costs a reconnect rather than lost mail.
+        email_manager.SMTP_NOOP_AFTER = 0
+        run("NOOP before every reuse", lambda: email_manager.send_batch(msgs))
+        controller.stop()
+        controller, _ = start_smtp_sink(sink, port)
+        run("after relay restart", lambda: email_manager.send_batch(msgs))
+    finally:
+        controller.stop()
+
+def legacy_build_diagnosis_email(recipient_email, username, disease, symptoms, treatment_pdf_data, illness_pdf_data):
+    """Diagnosis email built as before the cached templates: logo read and every part encoded per message."""
+    from email import encoders
+    from email.mime.base import MIMEBase
+    from email.mime.image import MIMEImage
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    import email_manager
+    msg = MIMEMultipart()
+    msg["From"] = "heydoc@example.com"
+    msg["To"] = recipient_email
+    msg["Subject"] = f"HeyDoc Diagnosis: {disease}"
+    symptoms_list = "</li><li>".join(symptoms) if symptoms else "None reported"
+    html_body = email_manager.DIAGNOSIS_EMAIL_TEMPLATE.substitute(username=username, disease=disease, symptoms_list=symptoms_list)
+    msg.attach(MIMEText(html_body, "html"))
+    with open(os.getenv("LOGO_PATH", "heydoc-high-resolution-logo.png"), 'rb') as img:
+        logo = MIMEImage(img.read())
+        logo.add_header('Content-ID', '<logo>')
+        msg.attach(logo)
+    for pdf_data, name in [(treatment_pdf_data, f"HeyDoc_Treatment_Plan_{disease}.pdf"), (illness_pdf_data, f"HeyDoc_Illness_Info_{disease}.pdf")]:
+        part = MIMEBase("application", "octet-stream")
+        part.set_payload(pdf_data.getvalue())
+        encoders.encode_base64(part)
+        part.add_header("Content-Disposition", f"attachment; filename={name}")
+        msg.attach(part)
+    return msg
+
+def bench_email_build(args):
+    """Per-message build + serialize time and peak allocation, per-message encoding vs cached templates and parts."""
+    import tracemalloc
+    from io import BytesIO
+    import email_manager
+    from pdf_generator import generate_treatment_pdf, generate_illness_pdf
+    disease = sorted(DISEASE_INFO)[0]
+    # Every diagnosis mails freshly stamped PDFs, so each message gets its own pair, as in production.
+    reports = [(generate_treatment_pdf(disease, DISEASE_INFO[disease], f"user{i}").getvalue(),
+                generate_illness_pdf(disease, DISEASE_INFO[disease], f"user{i}").getvalue()) for i in range(args.rows)]
+
+    builders = [
+        ("per-message encoding", lambda i: legacy_build_diagnosis_email(
+            "patient@example.com", f"user{i}", disease, ["Fever"], BytesIO(reports[i][0]), BytesIO(reports[i][1]))),
+        ("compiled templates/logo part", lambda i: email_manager.build_diagnosis_email(
+            "heydoc@example.com", "patient@example.com", f"user{i}", disease, ["Fever"], BytesIO(reports[i][0]), BytesIO(reports[i][1]))),
+    ]
+    sizes = []
+    for label, build in builders:
+        build(0).as_bytes()  # warm the template and logo caches
+        report_latency(f"{label} build", time_calls(build, range(args.rows)))
+        report_latency(f"{label} build + serialize", time_calls(lambda i: build(i).as_bytes(), range(args.rows)))
+        tracemalloc.start()
+        sizes.append(len(build(1 % args.rows).as_bytes()))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label}: peak {peak / 1024:.0f} KB allocated per message, {sizes[-1] / 1024:.0f} KB message")
+    assert abs(sizes[0] - sizes[1]) < 1024, "cached build produced a different message"
+
+def import_time_report(statement, cwd):
+    """Run `statement` in a fresh interpreter under -X importtime; returns {top-level package: self seconds}."""
+    import subprocess
+    import sys
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=cwd,
+                          capture_output=True, text=True, check=True)
+    packages = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1e6
+    return packages
+
+def bench_import_time(args):
+    """Where import time goes when the login page first loads main.py."""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    baseline = import_time_report('import streamlit', repo)
+    packages = import_time_report('import main', repo)
+    extra = {name: seconds - baseline.get(name, 0) for name, seconds in packages.items()}
+    print(f"import streamlit: {sum(baseline.values()) * 1000:.0f} ms; import main adds {sum(extra.values()) * 1000:.0f} ms:")
+    for name, seconds in sorted(extra.items(), key=lambda item: -item[1])[:15]:
+        print(f"  {name:<24} {seconds * 1000:8.1f} ms")
+
+COLD_START_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file('main.py', default_timeout=120)
+if sys.argv[1] != '-':
+    at.session_state['logged_in'] = True
+    at.session_state['username'] = sys.argv[1]
+at.run()
+assert not at.exception, at.exception
+done = time.perf_counter()
+print(json.dumps({'streamlit': imported - start, 'first_run': done - imported,
+                  'heavy': [name for name in ('sklearn', 'pandas', 'reportlab', 'smtplib', 'streamlit_extras') if name in sys.modules]}))
+"""
+
+def bench_cold_start(args):
+    """Fresh-process time to the login form, and to the first logged-in page, as a Streamlit worker sees them."""
+    import subprocess
+    import sys
+    repo = os.path.dirname(os.path.abspath(__file__))
+    for label, user in [("login form", "-"), ("logged-in first page", "admin")]:
+        runs = []
+        for _ in range(args.loop_rows):
+            start = time.perf_counter()
+            proc = subprocess.run([sys.executable, '-c', COLD_START_PROBE, user], cwd=repo, capture_output=True, text=True, check=True)
+            wall = time.perf_counter() - start
+            runs.append((wall, json.loads(proc.stdout.strip().splitlines()[-1])))
+        wall, probe = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+        print(f"{label}: process {wall * 1000:.0f} ms, of which streamlit import {probe['streamlit'] * 1000:.0f} ms "
+              f"and first script run {probe['first_run'] * 1000:.0f} ms (median of {len(runs)}); "
+              f"heavy modules loaded: {', '.join(probe['heavy']) or 'none'}")
+
+def bench_disease_info(args):
+    """Loading disease_info.json vs the compiled artifact, and rendering a diagnosis's sections from each."""
+    from disease_catalog import DISEASE_INFO_FILE, DiseaseCatalog, load_catalog, source_stat
+    repo = os.path.dirname(os.path.abspath(__file__))
+    source = os.path.join(repo, DISEASE_INFO_FILE)
+
+    def best(fn, loops=args.loop_rows):
+        timings = []
+        for _ in range(loops):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def parse_json():
+        with open(source, 'r') as f:
+            return json.load(f)
+
+    def compile_json():
+        with open(source, 'rb') as f:
+            return DiseaseCatalog(json.loads(f.read()), source_stat(os.fstat(f.fileno())))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifact = os.path.join(tmp, 'disease_info.compiled.json')
+        compile_json().save(artifact)
+        catalog = load_catalog(source, artifact)
+        print(f"{len(catalog)} diseases; JSON {os.path.getsize(source) / 1024:.0f} KB, artifact {os.path.getsize(artifact) / 1024:.0f} KB")
+        print(f"json.load:                 {best(parse_json) * 1000:.2f} ms")
+        print(f"json.load + compile:       {best(compile_json) * 1000:.2f} ms")
+        print(f"load_catalog (artifact):   {best(lambda: load_catalog(source, artifact)) * 1000:.2f} ms")
+
+    # The prediction expander and treatment plan of main.py for args.rows diagnoses, per item vs per section.
+    from streamlit.testing.v1 import AppTest
+    sections = ["definition", "symptoms", "causes", "risk_factors", "prevention"]
+    render_loops = f"""
+import streamlit as st
+from constants import DISEASE_CATALOG
+for disease in DISEASE_CATALOG.names[:{args.rows}]:
+    data = DISEASE_CATALOG.get(disease)
+    for key in {sections!r}:
+        for item in data.get(key, []):
+            st.markdown(f"- {{item}}")
+    for item in data["treatment"]:
+        st.markdown(f'<div class="remedy-item">{{item}}</div>', unsafe_allow_html=True)
+"""
+    render_lookups = f"""
+import streamlit as st
+from constants import DISEASE_CATALOG
+for disease in DISEASE_CATALOG.names[:{args.rows}]:
+    for key in {sections!r}:
+        st.markdown(DISEASE_CATALOG.markdown(disease, key))
+    st.markdown(DISEASE_CATALOG.html(disease, "treatment"), unsafe_allow_html=True)
+"""
+    cwd = os.getcwd()
+    os.chdir(repo)
+    try:
+        for label, script in [("per-item loops", render_loops), ("catalog lookups", render_lookups)]:
+            at = AppTest.from_string(script, default_timeout=120)
+            at.run()
+            diagnoses = min(args.rows, len(catalog))
+            seconds = best(at.run, loops=5)
+            print(f"{label:<16} {seconds / diagnoses * 1000:6.2f} ms per diagnosis, "
+                  f"{len(at.markdown) / diagnoses:.1f} st.markdown calls")
+    finally:
+        os.chdir(cwd)
+
+def bench_search(args):
+    """Index build time and per-query latency of disease_search, against the 5 ms per query budget."""
+    from disease_search import SearchIndex, SEARCH_FIELDS
+    start = time.perf_counter()
+    index = SearchIndex(DISEASE_CATALOG)
+    print(f"indexed {len(index)} diseases in {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{sum(len(postings) for postings in index.postings.values())} field terms")
+
+    rng = random.Random(0)
+    words = [word for name in DISEASE_CATALOG.names for field in SEARCH_FIELDS if field != "name"
+             for item in DISEASE_CATALOG.items(name, field) for word in item.split()]
+    queries = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 4))) for _ in range(args.rows)]
+    scopes = [None, ["symptoms"], ["causes"], ["risk_factors"]]
+    timings = []
+    for n, query in enumerate(queries):
+        start = time.perf_counter()
+        index.search(query, 10, scopes[n % len(scopes)])
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    p50, p99, worst = (timings[int(q * (len(timings) - 1))] * 1000 for q in (0.5, 0.99, 1.0))
+    print(f"{len(queries)} queries of 1-4 words: p50 {p50:.3f} ms, p99 {p99:.3f} ms, max {worst:.3f} ms "
+          f"({'within' if worst < 5 else 'OVER'} the 5 ms budget)")
+
+BENCHMARKS = {
+    'predict-batch': bench_predict_batch,
+    'predict-single': bench_predict_single,
+    'predict-cache': bench_predict_cache,
+    'predict-topk': bench_predict_topk,
+    'pdf': bench_pdf,
+    'history': bench_history,
+    'history-journal': bench_history_journal,
+    'storage': bench_storage,
+    'json-stress': bench_json_stress,
+    'dashboard': bench_dashboard,
+    'email-outbox': bench_email_outbox,
+    'email-pool': bench_email_pool,
+    'email-build': bench_email_build,
+    'import-time': bench_import_time,
+    'cold-start': bench_cold_start,
+    'disease-info': bench_disease_info,
+    'search': bench_search,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="HeyDoc benchmarks")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--loop-rows', type=int, default=200)
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--relay-delay', type=float, default=0.2)
+    parser.add_argument('--connect-delay', type=float, default=0.0)
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    main()
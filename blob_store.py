@@ -0,0 +1,81 @@
+import hashlib
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: blob_lock() only serialises this process's threads
+    fcntl = None
+
+BLOB_DIR = os.getenv("BLOB_DIR", "blobs")
+_thread_lock = threading.Lock()
+
+def blob_path(digest):
+    return os.path.join(BLOB_DIR, digest[:2], digest[2:])
+
+def _fsync_dir(path):
+    if os.name == 'nt':  # directories can't be opened for fsync there
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def blob_lock():
+    """Exclusive lock between writers that put blobs and reference them, and delete_unreferenced().
+
+    Hold it from put_blob() until the history entry naming the digest is saved:
+    put_blob() skips data that is already stored, so without the lock a delete
+    could remove that blob just before the new entry starts referencing it.
+    """
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    with _thread_lock:
+        fd = os.open(os.path.join(BLOB_DIR, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+def put_blob(data):
+    """Store `data` under its SHA-256 digest and return the digest; identical data is stored once.
+
+    The blob and its directory entry are on disk before this returns, so a history
+    entry saved afterwards never names a blob a crash could lose.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if not os.path.exists(path):
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+            _fsync_dir(BLOB_DIR)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        _fsync_dir(directory)
+    return digest
+
+def get_blob(digest):
+    with open(blob_path(digest), 'rb') as file:
+        return file.read()
+
+def delete_blobs(digests):
+    """Remove the blobs named by `digests`; the caller holds blob_lock() and has checked nothing references them."""
+    for digest in digests:
+        try:
+            os.unlink(blob_path(digest))
+        except FileNotFoundError:
+            pass
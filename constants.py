@@ -1,35 +1,35 @@
-import json
-import streamlit as st
-import pytz
-
-TIMEZONE = pytz.timezone('Asia/Colombo')
-
-SYMPTOMS = [
-    "Fever",
-    "Cough",
-    "Fatigue",
-    "Difficulty breathing",
-    "Headache",
-    "Rash",
-    "Nausea",
-    "Joint pain",
-    "Weight change"
-]
-
-@st.cache_data
-def load_disease_info():
-    try:
-        with open('disease_info.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        st.error("Disease information file not found. Using fallback data.")
-        return {
-            "Common Cold": {
-                "description": "A viral infection of your nose and throat.",
-                "symptoms": ["Runny nose", "Sore throat", "Cough"],
-                "remedies": ["Rest", "Drink fluids"],
-                "when_to_see_doctor": "If symptoms persist"
-            }
-        }
-
-DISEASE_INFO = load_disease_info()
\ No newline at end of file
+import streamlit as st
+import pytz
+from disease_catalog import DiseaseCatalog, load_catalog
+
+TIMEZONE = pytz.timezone('Asia/Colombo')
+
+SYMPTOMS = [
+    "Fever",
+    "Cough",
+    "Fatigue",
+    "Difficulty breathing",
+    "Headache",
+    "Rash",
+    "Nausea",
+    "Joint pain",
+    "Weight change"
+]
+
+@st.cache_resource(show_spinner=False)
+def load_disease_catalog():
+    """disease_info.json, compiled; read from the artifact `python disease_catalog.py build` writes when it is up to date."""
+    try:
+        return load_catalog()
+    except FileNotFoundError:
+        st.error("Disease information file not found. Using fallback data.")
+        return DiseaseCatalog({
+            "Common Cold": {
+                "description": "A viral infection of your nose and throat.",
+                "symptoms": ["Runny nose", "Sore throat", "Cough"],
+                "remedies": ["Rest", "Drink fluids"],
+                "when_to_see_doctor": "If symptoms persist"
+            }
+        })
+
+DISEASE_CATALOG = load_disease_catalog()
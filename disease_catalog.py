@@ -0,0 +1,225 @@
+"""disease_info.json compiled into the form the UI and the PDF reports read it in.
+
+Every section of every disease is pre-rendered once: as a markdown bullet list,
+and for the treatment plan as the escaped remedy-item HTML main.py shows. All
+fragments live in one string and a section is an offset pair into it, so the
+artifact loads as a single string plus small lists of offsets, and showing a
+section is a dict lookup and a slice instead of a loop over its items. Names are indexed
+case- and punctuation-insensitively ("alzheimer's disease" finds "Alzheimer’s Disease").
+
+The compiled catalog is saved as JSON to DISEASE_INFO_ARTIFACT with the size and
+mtime of the JSON it was built from. It is plain data rather than a pickle, so a file
+planted in the working directory can't run code when the app starts. The artifact is
+built explicitly, at deploy time; loading compares the source's stat with the recorded
+one, so an up-to-date artifact is read without reading or hashing the source, and
+compiles the JSON in memory when the artifact is missing or stale, without writing anything.
+
+    python disease_catalog.py build   # write DISEASE_INFO_ARTIFACT
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from array import array
+from html import escape
+
+DISEASE_INFO_FILE = "disease_info.json"
+DISEASE_INFO_ARTIFACT = os.getenv("DISEASE_INFO_ARTIFACT", "disease_info.compiled.json")
+# Bump when the compiled layout changes so old artifacts are ignored instead of misread.
+ARTIFACT_VERSION = 3
+
+# Sections main.py shows as remedy-item HTML rather than as a markdown list.
+HTML_SECTIONS = ("treatment",)
+BULLET = "- "
+
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'"})
+
+def normalize_name(name):
+    """Lookup key for a disease name: NFKC, straight apostrophes, casefolded, single spaces."""
+    name = unicodedata.normalize("NFKC", name).translate(_APOSTROPHES).casefold()
+    return " ".join(re.sub(r"[^\w'/()+-]+", " ", name).split())
+
+class DiseaseCatalog:
+    """The compiled disease_info.json.
+
+    `text` holds every fragment back to back. `sections[name][key]` is
+    (start, end, first, stop): the markdown list is text[start:end], and its items are
+    the spans first..stop-1 of `item_spans`, which index into the same markdown. `html_spans`
+    maps name and key to the (start, end) of that section's HTML fragment.
+    """
+    def __init__(self, info, source_stat=None):
+        self.source_stat = source_stat
+        self.names = list(info)
+        self.index = {normalize_name(name): name for name in info}
+        self.sections, self.html_spans = {}, {}
+        self.item_spans = array('I')
+        parts, length = [], 0
+        for name, disease_data in info.items():
+            sections = self.sections[name] = {}
+            for key, items in disease_data.items():
+                items = [items] if isinstance(items, str) else [str(item) for item in items]
+                start, first = length, len(self.item_spans) // 2
+                for n, item in enumerate(items):
+                    prefix = ("\n" if n else "") + BULLET
+                    self.item_spans.extend((length + len(prefix), length + len(prefix) + len(item)))
+                    parts.append(prefix + item)
+                    length += len(prefix) + len(item)
+                sections[key] = (start, length, first, len(self.item_spans) // 2)
+                if key in HTML_SECTIONS:
+                    fragment = "".join(f'<div class="remedy-item">{escape(item, quote=False)}</div>' for item in items)
+                    self.html_spans.setdefault(name, {})[key] = (length, length + len(fragment))
+                    parts.append(fragment)
+                    length += len(fragment)
+        self.text = "".join(parts)
+        self._data = {}
+
+    def __contains__(self, name):
+        return self.resolve(name) is not None
+
+    def __len__(self):
+        return len(self.names)
+
+    def resolve(self, name):
+        """The catalog's spelling of `name`, matched exactly or through the normalized index."""
+        if name in self.sections:
+            return name
+        if not isinstance(name, str):
+            return None
+        return self.index.get(normalize_name(name))
+
+    def items(self, name, key):
+        """The entries of section `key` of `name`, as listed in disease_info.json."""
+        name = self.resolve(name)
+        if name is None or key not in self.sections[name]:
+            return []
+        _, _, first, stop = self.sections[name][key]
+        spans, text = self.item_spans, self.text
+        return [text[spans[2 * i]:spans[2 * i + 1]] for i in range(first, stop)]
+
+    def get(self, name):
+        """The {section: [entries]} dict of `name` as in disease_info.json, or None."""
+        name = self.resolve(name)
+        if name is None:
+            return None
+        data = self._data.get(name)
+        if data is None:
+            data = self._data[name] = {key: self.items(name, key) for key in self.sections[name]}
+        return data
+
+    @property
+    def info(self):
+        """Every disease as get() returns it, i.e. disease_info.json itself."""
+        return {name: self.get(name) for name in self.names}
+
+    def markdown(self, name, key):
+        """Section `key` of `name` as one markdown bullet list; "" when there is none."""
+        name = self.resolve(name)
+        span = self.sections[name].get(key) if name is not None else None
+        return self.text[span[0]:span[1]] if span else ""
+
+    def html(self, name, key):
+        """Section `key` (one of HTML_SECTIONS) of `name` as escaped remedy-item divs; "" when there is none."""
+        name = self.resolve(name)
+        span = self.html_spans.get(name, {}).get(key) if name is not None else None
+        return self.text[span[0]:span[1]] if span else ""
+
+    def has_section(self, name, key):
+        name = self.resolve(name)
+        return name is not None and key in self.sections[name]
+
+    def save(self, path):
+        """Write the compiled catalog to `path` as JSON, atomically."""
+        payload = {
+            "version": ARTIFACT_VERSION,
+            "source_stat": self.source_stat,
+            "names": self.names,
+            "index": self.index,
+            "text": self.text,
+            "sections": self.sections,
+            "html_spans": self.html_spans,
+            "item_spans": self.item_spans.tolist(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f".{os.path.basename(path)}.")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(payload, file, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def from_payload(cls, payload):
+        catalog = cls.__new__(cls)
+        for field in ("source_stat", "names", "index", "text", "sections", "html_spans"):
+            setattr(catalog, field, payload[field])
+        catalog.item_spans = array('I', payload["item_spans"])
+        catalog._data = {}
+        return catalog
+
+def source_stat(stat):
+    """What an artifact records of its source: [size, mtime in ns]. Any rewrite of the file changes the mtime."""
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _compile(source):
+    with open(source, "rb") as file:
+        stat = os.fstat(file.fileno())
+        return DiseaseCatalog(json.loads(file.read()), source_stat(stat))
+
+def _read_artifact(path, stat):
+    """The compiled catalog at `path` if it was built from a source with `stat` by this ARTIFACT_VERSION, else None."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            payload = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(payload, dict) or payload.get("version") != ARTIFACT_VERSION:
+        return None
+    if stat is not None and payload.get("source_stat") != source_stat(stat):
+        return None
+    try:
+        return DiseaseCatalog.from_payload(payload)
+    except (KeyError, TypeError, OverflowError):
+        return None
+
+def load_catalog(source=DISEASE_INFO_FILE, artifact=DISEASE_INFO_ARTIFACT):
+    """The compiled catalog of `source`, read from `artifact` when it is up to date.
+
+    Without `source` an existing artifact is used as is. A missing or stale artifact
+    means compiling `source` in memory; only build() writes the artifact. Raises
+    FileNotFoundError only when neither file exists.
+    """
+    try:
+        stat = os.stat(source)
+    except FileNotFoundError:
+        catalog = _read_artifact(artifact, None)
+        if catalog is None:
+            raise
+        return catalog
+    catalog = _read_artifact(artifact, stat)
+    if catalog is None:
+        catalog = _compile(source)
+    return catalog
+
+def build(source, artifact):
+    start = time.perf_counter()
+    catalog = _compile(source)
+    catalog.save(artifact)
+    print(f"Compiled {len(catalog)} diseases from {source} into {artifact} "
+          f"({os.path.getsize(artifact) / 1024:.0f} KB) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="HeyDoc disease_info.json compiler")
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--source', default=DISEASE_INFO_FILE)
+    parser.add_argument('--artifact', default=DISEASE_INFO_ARTIFACT)
+    args = parser.parse_args()
+
+    build(args.source, args.artifact)
+
+if __name__ == "__main__":
+    main()
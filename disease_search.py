@@ -0,0 +1,128 @@
+"""Full-text search over the disease catalog.
+
+Each disease is one document made of its name, definition, symptoms, causes and
+risk factors. Text is tokenized, stop words are dropped and words are reduced by a
+small suffix-stripping stemmer, so "coughing", "coughs" and "cough" meet. An
+inverted index per field maps each term to {disease: term frequency}, and queries
+are ranked with BM25, summed over the searched fields with per-field weights.
+"""
+import functools
+import math
+import re
+import unicodedata
+from collections import Counter
+import streamlit as st
+from constants import DISEASE_CATALOG
+
+# Searchable fields and how much a match in each counts towards a disease's score.
+SEARCH_FIELDS = {
+    "name": 3.0,
+    "symptoms": 1.5,
+    "causes": 1.0,
+    "risk_factors": 1.0,
+    "definition": 0.5,
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOP_WORDS = frozenset("""
+a an and are as at be by can do does for from has have in into is it its may more most of often on or
+such than that the their these this to via when which while with within without e g eg
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_POSSESSIVE = re.compile(r"['’]s\b")
+# Tried in order, first match only; the stem left behind must keep at least 3 letters.
+_SUFFIXES = (
+    ("sses", "ss"), ("ies", "y"), ("ied", "y"), ("ness", ""), ("ments", ""), ("ment", ""),
+    ("ings", ""), ("ing", ""), ("edly", ""), ("ed", ""), ("ly", ""),
+    ("tions", "t"), ("tion", "t"), ("sions", "s"), ("sion", "s"),
+)
+
+@functools.lru_cache(maxsize=None)
+def stem(word):
+    """Crude English stem: one suffix from _SUFFIXES, a plural s, then a final e."""
+    for suffix, replacement in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) + len(replacement) >= 3:
+            word = word[:-len(suffix)] + replacement
+            break
+    else:
+        if word.endswith("s") and not word.endswith(("ss", "us", "is")) and len(word) > 3:
+            word = word[:-1]
+    if word.endswith("e") and len(word) > 4:
+        word = word[:-1]
+    return word
+
+def tokenize(text):
+    """Stemmed terms of `text`, in order, without stop words, possessives or single characters."""
+    text = _POSSESSIVE.sub("", unicodedata.normalize("NFKC", text).casefold())
+    return [stem(word) for word in _TOKEN.findall(text) if len(word) > 1 and word not in STOP_WORDS]
+
+class SearchIndex:
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.names = list(catalog.names)
+        self.postings = {field: {} for field in SEARCH_FIELDS}
+        self.lengths = {field: [0] * len(self.names) for field in SEARCH_FIELDS}
+        # Per disease and field: (entry, its terms), to show which entries matched.
+        self.entries = []
+        for doc, name in enumerate(self.names):
+            doc_entries = {}
+            for field in SEARCH_FIELDS:
+                items = [name] if field == "name" else catalog.items(name, field)
+                tokens = [tokenize(item) for item in items]
+                doc_entries[field] = [(item, frozenset(item_tokens)) for item, item_tokens in zip(items, tokens)]
+                counts = Counter(term for item_tokens in tokens for term in item_tokens)
+                self.lengths[field][doc] = sum(counts.values())
+                postings = self.postings[field]
+                for term, count in counts.items():
+                    postings.setdefault(term, {})[doc] = count
+            self.entries.append(doc_entries)
+        n_docs = len(self.names)
+        self.avg_lengths = {field: (sum(lengths) / n_docs if n_docs else 0) or 1 for field, lengths in self.lengths.items()}
+        self.idf = {
+            field: {term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5)) for term, docs in postings.items()}
+            for field, postings in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query, limit=10, fields=None):
+        """The best `limit` diseases for `query`, best first.
+
+        `fields` restricts matching to some of SEARCH_FIELDS. Each hit is a dict with
+        "disease", "score" and "matches", the {field: [entries]} that contain a query term.
+        """
+        terms = set(tokenize(query))
+        fields = [field for field in (fields or SEARCH_FIELDS) if field in SEARCH_FIELDS]
+        scores = {}
+        for field in fields:
+            weight, postings, idf = SEARCH_FIELDS[field], self.postings[field], self.idf[field]
+            lengths, avg_length = self.lengths[field], self.avg_lengths[field]
+            for term in terms:
+                docs = postings.get(term)
+                if not docs:
+                    continue
+                term_idf = idf[term]
+                for doc, tf in docs.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / avg_length)
+                    scores[doc] = scores.get(doc, 0.0) + weight * term_idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [{"disease": self.names[doc], "score": score, "matches": self._matches(doc, fields, terms)} for doc, score in ranked]
+
+    def _matches(self, doc, fields, terms):
+        matches = {}
+        for field in fields:
+            matched = [item for item, item_terms in self.entries[doc][field] if item_terms & terms]
+            if matched:
+                matches[field] = matched
+        return matches
+
+@st.cache_resource(show_spinner=False)
+def get_search_index():
+    """Process-wide SearchIndex over DISEASE_CATALOG, built on the first search."""
+    return SearchIndex(DISEASE_CATALOG)
+
+def search_diseases(query, limit=10, fields=None):
+    return get_search_index().search(query, limit, fields)
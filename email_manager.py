@@ -1,253 +1,581 @@
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email.mime.image import MIMEImage
-from email import encoders
-import os
-from dotenv import load_dotenv
-import uuid
-import datetime
-import pytz
-import logging
-import json
-
-logging.basicConfig(level=logging.INFO, filename='email.log', format='%(asctime)s - %(levelname)s - %(message)s')
-load_dotenv()
-
-def send_diagnosis_email(recipient_email, username, disease, symptoms, treatment_pdf_data, illness_pdf_data):
-    try:
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", 587))
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-        logo_path = os.getenv("LOGO_PATH", "heydoc-high-resolution-logo.png")
-
-        if not sender_email or not sender_password:
-            logging.error("Missing SMTP credentials")
-            return False, "Email configuration is missing."
-
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = recipient_email
-        msg["Subject"] = f"HeyDoc Diagnosis: {disease}"
-
-        symptoms_list = "</li><li>".join(symptoms) if symptoms else "None reported"
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; color: #0f172a; background-color: #f8fafc; padding: 20px; }}
-                .container {{ max-width: 600px; margin: auto; background: #ffffff; border-radius: 12px; padding: 20px; }}
-                .header {{ background-color: #3b82f6; color: #ffffff; padding: 15px; text-align: center; border-radius: 12px 12px 0 0; }}
-                .header img {{ max-width: 150px; }}
-                .content {{ padding: 20px; }}
-                h2 {{ color: #1e293b; }}
-                ul {{ list-style-type: none; padding: 0; }}
-                li {{ padding: 5px 0; }}
-                .footer {{ text-align: center; color: #94a3b8; font-size: 0.85rem; margin-top: 20px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <img src="cid:logo" alt="HeyDoc Logo">
-                    <h2>Diagnosis Report</h2>
-                </div>
-                <div class="content">
-                    <p>Dear {username},</p>
-                    <p>Your recent HeyDoc assessment results:</p>
-                    <h3>Condition: {disease}</h3>
-                    <p>Symptoms:</p>
-                    <ul><li>{symptoms_list}</li></ul>
-                    <p>Attached: Treatment Plan and Illness Info PDFs.</p>
-                    <p><em>Consult a healthcare provider for medical advice.</em></p>
-                </div>
-                <div class="footer">
-                    © 2023 HeyDoc™. All rights reserved.
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        msg.attach(MIMEText(html_body, "html"))
-
-        if os.path.exists(logo_path):
-            with open(logo_path, 'rb') as img:
-                logo = MIMEImage(img.read())
-                logo.add_header('Content-ID', '<logo>')
-                msg.attach(logo)
-        else:
-            logging.warning(f"Logo not found at {logo_path}")
-
-        for pdf_data, name in [
-            (treatment_pdf_data, f"HeyDoc_Treatment_Plan_{disease}.pdf"),
-            (illness_pdf_data, f"HeyDoc_Illness_Info_{disease}.pdf")
-        ]:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(pdf_data.getvalue())
-            encoders.encode_base64(part)
-            part.add_header("Content-Disposition", f"attachment; filename={name}")
-            msg.attach(part)
-
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-        
-        logging.info(f"Diagnosis email sent to {recipient_email}")
-        return True, "Email sent successfully!"
-    except Exception as e:
-        logging.error(f"Failed to send diagnosis email to {recipient_email}: {str(e)}")
-        return False, f"Failed to send email: {str(e)}"
-
-def send_confirmation_email(recipient_email, username, token):
-    try:
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", 587))
-        sender_email = os.getenv("SENDER_EMAIL")
-        sender_password = os.getenv("SENDER_PASSWORD")
-        logo_path = os.getenv("LOGO_PATH", "heydoc-high-resolution-logo.png")
-
-        if not sender_email or not sender_password:
-            logging.error("Missing SMTP credentials")
-            return False, "Email configuration is missing."
-
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = recipient_email
-        msg["Subject"] = "HeyDoc Account Confirmation"
-
-        confirmation_url = f"http://localhost:8501/?confirm=true&username={username}&token={token}"
-        html_body = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; color: #0f172a; background-color: #f8fafc; padding: 20px; }}
-                .container {{ max-width: 600px; margin: auto; background: #ffffff; border-radius: 12px; padding: 20px; }}
-                .header {{ background-color: #3b82f6; color: #ffffff; padding: 15px; text-align: center; border-radius: 12px 12px 0 0; }}
-                .header img {{ max-width: 150px; }}
-                .content {{ padding: 20px; }}
-                a.button {{ display: inline-block; padding: 10px 20px; background-color: #3b82f6; color: #ffffff; text-decoration: none; border-radius: 8px; }}
-                .footer {{ text-align: center; color: #94a3b8; font-size: 0.85rem; margin-top: 20px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <img src="cid:logo" alt="HeyDoc Logo">
-                    <h2>Confirm Your Account</h2>
-                </div>
-                <div class="content">
-                    <p>Dear {username},</p>
-                    <p>Please confirm your HeyDoc account:</p>
-                    <a href="{confirmation_url}" class="button">Confirm Account</a>
-                    <p>Or use this link: <a href="{confirmation_url}">{confirmation_url}</a></p>
-                    <p>Token: {token}</p>
-                    <p>Expires in 24 hours.</p>
-                </div>
-                <div class="footer">
-                    © 2023 HeyDoc™. All rights reserved.
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        msg.attach(MIMEText(html_body, "html"))
-
-        if os.path.exists(logo_path):
-            with open(logo_path, 'rb') as img:
-                logo = MIMEImage(img.read())
-                logo.add_header('Content-ID', '<logo>')
-                msg.attach(logo)
-        else:
-            logging.warning(f"Logo not found at {logo_path}")
-
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(sender_email, sender_password)
-            server.send_message(msg)
-        
-        logging.info(f"Confirmation email sent to {recipient_email}")
-        return True, "Confirmation email sent!"
-    except Exception as e:
-        logging.error(f"Failed to send confirmation email to {recipient_email}: {str(e)}")
-        return False, f"Failed to send confirmation email: {str(e)}"
-
-def generate_confirmation_token():
-    return str(uuid.uuid4())
-
-def store_pending_user(username, password, email, token):
-    try:
-        try:
-            with open('pending_users.json', 'r') as file:
-                data = json.load(file)
-                pending_users = data.get('pending_users', [])
-        except (FileNotFoundError, json.JSONDecodeError):
-            pending_users = []
-
-        if any(u['username'].lower() == username.lower() or u['email'] == email for u in pending_users):
-            return False, "Username or email already pending confirmation!"
-        
-        timestamp = datetime.datetime.now(pytz.timezone('Asia/Colombo')).strftime("%Y-%m-%d %H:%M:%S")
-        pending_users.append({
-            "username": username,
-            "password": password,  # Store plain text password
-            "email": email,
-            "token": token,
-            "timestamp": timestamp
-        })
-
-        with open('pending_users.json', 'w') as file:
-            json.dump({"pending_users": pending_users}, file, indent=2)
-        
-        logging.info(f"Stored pending user: {username}")
-        return True, "Pending user stored!"
-    except Exception as e:
-        logging.error(f"Failed to store pending user {username}: {str(e)}")
-        return False, f"Failed to store pending user: {str(e)}"
-
-def confirm_user(username, token):
-    try:
-        with open('pending_users.json', 'r') as file:
-            data = json.load(file)
-            pending_users = data.get('pending_users', [])
-
-        for user in pending_users:
-            if user['username'].lower() == username.lower() and user['token'] == token:
-                user_time = datetime.datetime.strptime(user['timestamp'], "%Y-%m-%d %H:%M:%S")
-                user_time = pytz.timezone('Asia/Colombo').localize(user_time)
-                current_time = datetime.datetime.now(pytz.timezone('Asia/Colombo'))
-                if (current_time - user_time).total_seconds() > 24 * 3600:
-                    logging.warning(f"Expired token for {username}")
-                    return False, "Confirmation token expired."
-                
-                from user_manager import load_users, save_users
-                users = load_users()
-                if any(u['username'].lower() == username.lower() or u['email'] == user['email'] for u in users):
-                    logging.warning(f"Username {username} or email already exists")
-                    return False, "Username or email already exists!"
-                
-                users.append({
-                    "username": user['username'],
-                    "password": user['password'],  # Store plain text password
-                    "email": user['email'],
-                    "is_admin": False,
-                    "usage_count": 0
-                })
-                save_users(users)
-                
-                pending_users.remove(user)
-                with open('pending_users.json', 'w') as file:
-                    json.dump({"pending_users": pending_users}, file, indent=2)
-                
-                logging.info(f"Confirmed user: {username}")
-                return True, "Account confirmed!"
-        
-        logging.warning(f"Invalid confirmation for {username}")
-        return False, "Invalid username or token."
-    except Exception as e:
-        logging.error(f"Failed to confirm user {username}: {str(e)}")
-        return False, f"Failed to confirm user: {str(e)}"
\ No newline at end of file
+import smtplib
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+from email.mime.image import MIMEImage
+from email import message_from_string
+from html import escape
+from string import Template
+import base64
+import functools
+import os
+from dotenv import load_dotenv
+import uuid
+import datetime
+import json
+import time
+import threading
+import pytz
+import logging
+from contextlib import contextmanager
+import streamlit as st
+from storage import atomic_write_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: orphaned claims are only recognised by OUTBOX_CLAIM_TIMEOUT
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO, filename='email.log', format='%(asctime)s - %(levelname)s - %(message)s')
+load_dotenv()
+
+OUTBOX_DIR = os.getenv("OUTBOX_DIR", "outbox")
+# Seconds before the first retry; doubles with every failed attempt up to OUTBOX_MAX_BACKOFF.
+OUTBOX_BACKOFF = float(os.getenv("OUTBOX_BACKOFF", 30))
+OUTBOX_MAX_BACKOFF = float(os.getenv("OUTBOX_MAX_BACKOFF", 3600))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 5))
+# A claimed message is locked by its worker while it is being sent; one nobody holds (its worker
+# died) goes back to the queue on the next pass. Without fcntl, claims older than this are released instead.
+OUTBOX_CLAIM_TIMEOUT = 600
+# Logged-in SMTP connections kept open per relay; 0 opens a new connection for every message.
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", 100))
+# Connections idle for longer than this are checked with NOOP before they are reused.
+SMTP_NOOP_AFTER = float(os.getenv("SMTP_NOOP_AFTER", 10))
+
+# Compiled once at import; user-supplied values are HTML-escaped before substitution.
+DIAGNOSIS_EMAIL_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; color: #0f172a; background-color: #f8fafc; padding: 20px; }
+        .container { max-width: 600px; margin: auto; background: #ffffff; border-radius: 12px; padding: 20px; }
+        .header { background-color: #3b82f6; color: #ffffff; padding: 15px; text-align: center; border-radius: 12px 12px 0 0; }
+        .header img { max-width: 150px; }
+        .content { padding: 20px; }
+        h2 { color: #1e293b; }
+        ul { list-style-type: none; padding: 0; }
+        li { padding: 5px 0; }
+        .footer { text-align: center; color: #94a3b8; font-size: 0.85rem; margin-top: 20px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <img src="cid:logo" alt="HeyDoc Logo">
+            <h2>Diagnosis Report</h2>
+        </div>
+        <div class="content">
+            <p>Dear ${username},</p>
+            <p>Your recent HeyDoc assessment results:</p>
+            <h3>Condition: ${disease}</h3>
+            <p>Symptoms:</p>
+            <ul><li>${symptoms_list}</li></ul>
+            <p>Attached: Treatment Plan and Illness Info PDFs.</p>
+            <p><em>Consult a healthcare provider for medical advice.</em></p>
+        </div>
+        <div class="footer">
+            © 2023 HeyDoc™. All rights reserved.
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+CONFIRMATION_EMAIL_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; color: #0f172a; background-color: #f8fafc; padding: 20px; }
+        .container { max-width: 600px; margin: auto; background: #ffffff; border-radius: 12px; padding: 20px; }
+        .header { background-color: #3b82f6; color: #ffffff; padding: 15px; text-align: center; border-radius: 12px 12px 0 0; }
+        .header img { max-width: 150px; }
+        .content { padding: 20px; }
+        a.button { display: inline-block; padding: 10px 20px; background-color: #3b82f6; color: #ffffff; text-decoration: none; border-radius: 8px; }
+        .footer { text-align: center; color: #94a3b8; font-size: 0.85rem; margin-top: 20px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <img src="cid:logo" alt="HeyDoc Logo">
+            <h2>Confirm Your Account</h2>
+        </div>
+        <div class="content">
+            <p>Dear ${username},</p>
+            <p>Please confirm your HeyDoc account:</p>
+            <a href="${confirmation_url}" class="button">Confirm Account</a>
+            <p>Or use this link: <a href="${confirmation_url}">${confirmation_url}</a></p>
+            <p>Token: ${token}</p>
+            <p>Expires in 24 hours.</p>
+        </div>
+        <div class="footer">
+            © 2023 HeyDoc™. All rights reserved.
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+def smtp_settings():
+    return {
+        "server": os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        "port": int(os.getenv("SMTP_PORT", 587)),
+        "sender_email": os.getenv("SENDER_EMAIL"),
+        "sender_password": os.getenv("SENDER_PASSWORD"),
+        # Only local test relays that don't offer TLS should turn this off.
+        "starttls": os.getenv("SMTP_STARTTLS", "1") == "1",
+    }
+
+@functools.lru_cache(maxsize=4)
+def _logo_part(logo_path, mtime):
+    """The logo as a MIME part, read and base64-encoded once per file version and shared by every message."""
+    with open(logo_path, 'rb') as img:
+        logo = MIMEImage(img.read())
+    logo.add_header('Content-ID', '<logo>')
+    return logo
+
+def attach_logo(msg):
+    logo_path = os.getenv("LOGO_PATH", "heydoc-high-resolution-logo.png")
+    try:
+        mtime = os.path.getmtime(logo_path)
+    except OSError:
+        logging.warning(f"Logo not found at {logo_path}")
+        return
+    msg.attach(_logo_part(logo_path, mtime))
+
+def pdf_attachment(data, filename):
+    """An attachment part with its base64 body encoded in one pass, without email.encoders' extra copies.
+
+    Every diagnosis stamps new PDFs and outbox retries resend the serialized message, so there
+    is nothing worth caching the encoding for.
+    """
+    part = MIMEBase("application", "octet-stream")
+    part.set_payload(base64.encodebytes(data).decode('ascii'))
+    part["Content-Transfer-Encoding"] = "base64"
+    part.add_header("Content-Disposition", f"attachment; filename={filename}")
+    return part
+
+def build_diagnosis_email(sender_email, recipient_email, username, disease, symptoms, treatment_pdf_data, illness_pdf_data):
+    msg = MIMEMultipart()
+    msg["From"] = sender_email
+    msg["To"] = recipient_email
+    msg["Subject"] = f"HeyDoc Diagnosis: {disease}"
+
+    symptoms_list = "</li><li>".join(escape(symptom) for symptom in symptoms) if symptoms else "None reported"
+    html_body = DIAGNOSIS_EMAIL_TEMPLATE.substitute(
+        username=escape(username), disease=escape(disease), symptoms_list=symptoms_list
+    )
+    msg.attach(MIMEText(html_body, "html"))
+    attach_logo(msg)
+
+    msg.attach(pdf_attachment(treatment_pdf_data.getvalue(), f"HeyDoc_Treatment_Plan_{disease}.pdf"))
+    msg.attach(pdf_attachment(illness_pdf_data.getvalue(), f"HeyDoc_Illness_Info_{disease}.pdf"))
+    return msg
+
+def build_confirmation_email(sender_email, recipient_email, username, token):
+    msg = MIMEMultipart()
+    msg["From"] = sender_email
+    msg["To"] = recipient_email
+    msg["Subject"] = "HeyDoc Account Confirmation"
+
+    confirmation_url = f"http://localhost:8501/?confirm=true&username={username}&token={token}"
+    html_body = CONFIRMATION_EMAIL_TEMPLATE.substitute(
+        username=escape(username), confirmation_url=escape(confirmation_url), token=escape(token)
+    )
+    msg.attach(MIMEText(html_body, "html"))
+    attach_logo(msg)
+    return msg
+
+def open_smtp(settings):
+    server = smtplib.SMTP(settings["server"], settings["port"])
+    try:
+        if settings["starttls"]:
+            server.starttls()
+        server.login(settings["sender_email"], settings["sender_password"])
+    except BaseException:
+        server.close()
+        raise
+    return server
+
+class SMTPPool:
+    """Up to `size` logged-in connections to one relay, reused across messages.
+
+    A connection is retired after `max_messages` messages, checked with NOOP
+    before reuse if it sat idle for SMTP_NOOP_AFTER seconds, and dropped on any
+    error. A connection that fails its NOOP, or a send that fails because the
+    relay closed the connection, is followed by a freshly opened connection:
+    the other idle ones are older still and likely closed too.
+    """
+
+    def __init__(self, settings, size, max_messages):
+        self.settings = settings
+        self.max_messages = max_messages
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []  # [server, messages sent, last used], most recently used last
+        self.connections_opened = 0
+
+    def _checkout(self, fresh=False):
+        with self._lock:
+            idle = self._idle.pop() if self._idle and not fresh else None
+        if idle is not None:
+            server, sent, last_used = idle
+            if time.monotonic() - last_used < SMTP_NOOP_AFTER:
+                return server, sent
+            try:
+                if server.noop()[0] == 250:
+                    return server, sent
+            except (smtplib.SMTPException, OSError):
+                pass
+            server.close()
+        with self._lock:
+            self.connections_opened += 1
+        return open_smtp(self.settings), 0
+
+    @contextmanager
+    def connection(self, fresh=False):
+        with self._slots:
+            server, sent = self._checkout(fresh)
+            try:
+                yield server
+            except BaseException:
+                server.close()
+                raise
+            sent += 1
+            if sent >= self.max_messages:
+                try:
+                    server.quit()
+                except (smtplib.SMTPException, OSError):
+                    server.close()
+            else:
+                with self._lock:
+                    self._idle.append([server, sent, time.monotonic()])
+
+    def send(self, msg):
+        try:
+            with self.connection() as server:
+                server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection(fresh=True) as server:
+                server.send_message(msg)
+
+    def send_many(self, msgs):
+        """Send `msgs` in order over pooled connections; returns an exception or None per message."""
+        results = []
+        for msg in msgs:
+            try:
+                self.send(msg)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _, _ in idle:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+
+@st.cache_resource
+def get_smtp_pool(server, port, sender_email, sender_password, starttls):
+    """The process-wide connection pool for one relay and login."""
+    settings = {"server": server, "port": port, "sender_email": sender_email,
+                "sender_password": sender_password, "starttls": starttls}
+    return SMTPPool(settings, SMTP_POOL_SIZE, SMTP_MAX_MESSAGES_PER_CONNECTION)
+
+def deliver(msg, settings):
+    if SMTP_POOL_SIZE == 0:
+        with open_smtp(settings) as server:
+            server.send_message(msg)
+    else:
+        get_smtp_pool(**settings).send(msg)
+
+def send_batch(msgs):
+    """Send already-built messages, over pooled connections when pooling is on; returns an exception or None per message."""
+    settings = smtp_settings()
+    if SMTP_POOL_SIZE == 0:
+        results = []
+        for msg in msgs:
+            try:
+                deliver(msg, settings)
+                results.append(None)
+            except Exception as e:
+                results.append(e)
+    else:
+        results = get_smtp_pool(**settings).send_many(msgs)
+    for msg, error in zip(msgs, results):
+        if error:
+            logging.error(f"Failed to send {msg['Subject']!r} to {msg['To']}: {str(error)}")
+    return results
+
+def send_diagnosis_email(recipient_email, username, disease, symptoms, treatment_pdf_data, illness_pdf_data):
+    try:
+        settings = smtp_settings()
+        if not settings["sender_email"] or not settings["sender_password"]:
+            logging.error("Missing SMTP credentials")
+            return False, "Email configuration is missing."
+
+        msg = build_diagnosis_email(settings["sender_email"], recipient_email, username, disease, symptoms, treatment_pdf_data, illness_pdf_data)
+        deliver(msg, settings)
+        
+        logging.info(f"Diagnosis email sent to {recipient_email}")
+        return True, "Email sent successfully!"
+    except Exception as e:
+        logging.error(f"Failed to send diagnosis email to {recipient_email}: {str(e)}")
+        return False, f"Failed to send email: {str(e)}"
+
+def send_confirmation_email(recipient_email, username, token):
+    try:
+        settings = smtp_settings()
+        if not settings["sender_email"] or not settings["sender_password"]:
+            logging.error("Missing SMTP credentials")
+            return False, "Email configuration is missing."
+
+        msg = build_confirmation_email(settings["sender_email"], recipient_email, username, token)
+        deliver(msg, settings)
+        
+        logging.info(f"Confirmation email sent to {recipient_email}")
+        return True, "Confirmation email sent!"
+    except Exception as e:
+        logging.error(f"Failed to send confirmation email to {recipient_email}: {str(e)}")
+        return False, f"Failed to send confirmation email: {str(e)}"
+
+class Outbox:
+    """Emails waiting to be sent, one JSON file each in `directory`.
+
+    A message is claimed by renaming its file into sending/, which only one
+    worker (thread or process) can win, and stays locked by that worker until it
+    is done. Sent messages are deleted; failures go back to the queue with an
+    exponential backoff and, after OUTBOX_MAX_ATTEMPTS, are parked in failed/ for
+    a person to look at. A claim whose worker died (e.g. the server restarted
+    mid-send) is unlocked, and the next pass puts it back in the queue.
+    """
+
+    def __init__(self, directory=OUTBOX_DIR):
+        self.directory = directory
+        self.sending_dir = os.path.join(directory, "sending")
+        self.failed_dir = os.path.join(directory, "failed")
+        for path in (directory, self.sending_dir, self.failed_dir):
+            os.makedirs(path, exist_ok=True)
+        self.wakeup = threading.Event()
+
+    def put(self, msg, description):
+        message_id = f"{time.time():.6f}-{uuid.uuid4().hex}"
+        atomic_write_json(os.path.join(self.directory, f"{message_id}.json"), {
+            "id": message_id,
+            "to": msg["To"],
+            "description": description,
+            "attempts": 0,
+            "next_attempt": 0,
+            "message": msg.as_string(),
+        })
+        self.wakeup.set()
+        return message_id
+
+    def pending(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+
+    def failed(self):
+        return sorted(name for name in os.listdir(self.failed_dir) if name.endswith('.json'))
+
+    def _claim(self, name):
+        """Move `name` into sending/ and lock it; returns (path, lock fd), or None if another worker has it."""
+        path = os.path.join(self.sending_dir, name)
+        try:
+            os.rename(os.path.join(self.directory, name), path)
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None  # another worker got it first, or released it again before we locked it
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            # _release_stale_claims may have moved it back between the rename and the lock.
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                os.utime(path)
+                return path, fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        return None
+
+    def _release_stale_claims(self):
+        """Put claims whose worker is gone back in the queue."""
+        for name in os.listdir(self.sending_dir):
+            path = os.path.join(self.sending_dir, name)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        continue  # a live worker is sending it
+                elif time.time() - os.fstat(fd).st_mtime <= OUTBOX_CLAIM_TIMEOUT:
+                    continue
+                os.rename(path, os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            finally:
+                os.close(fd)
+
+    def process_due(self, send=deliver):
+        """Try every message whose retry time has come; returns the number sent."""
+        self._release_stale_claims()
+        settings = smtp_settings()
+        sent = 0
+        for name in self.pending():
+            try:
+                with open(os.path.join(self.directory, name), 'r') as file:
+                    entry = json.load(file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            if entry["next_attempt"] > time.time():
+                continue
+            claim = self._claim(name)
+            if claim is None:
+                continue
+            path, fd = claim
+            try:
+                sent += self._send_claimed(path, name, entry, send, settings)
+            finally:
+                os.close(fd)
+        return sent
+
+    def _send_claimed(self, path, name, entry, send, settings):
+        """Send a claimed message, then delete the claim or requeue/park it; returns whether it was sent."""
+        try:
+            send(message_from_string(entry["message"]), settings)
+        except Exception as e:
+            entry["attempts"] += 1
+            if entry["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                logging.error(f"Giving up on {entry['description']} to {entry['to']} after {entry['attempts']} attempts: {str(e)}")
+                atomic_write_json(os.path.join(self.failed_dir, name), entry)
+            else:
+                delay = min(OUTBOX_BACKOFF * 2 ** (entry["attempts"] - 1), OUTBOX_MAX_BACKOFF)
+                entry["next_attempt"] = time.time() + delay
+                logging.warning(f"Failed to send {entry['description']} to {entry['to']} (attempt {entry['attempts']}), retrying in {delay:.0f}s: {str(e)}")
+                atomic_write_json(os.path.join(self.directory, name), entry)
+            os.unlink(path)
+            return False
+        os.unlink(path)
+        logging.info(f"Sent {entry['description']} to {entry['to']}")
+        return True
+
+    def start(self):
+        """Run the worker in a daemon thread; returns the Event that stops it."""
+        stop = threading.Event()
+        threading.Thread(target=self.run, args=(stop,), name="email-outbox", daemon=True).start()
+        return stop
+
+    def run(self, stop=None):
+        """Drain the outbox until `stop` is set, waking early whenever a message is queued.
+
+        The first pass runs straight away, so messages left queued or half-sent by a previous
+        server process are released and sent as soon as the worker starts.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.process_due()
+            except Exception as e:
+                logging.error(f"Outbox worker error: {str(e)}")
+            self.wakeup.wait(OUTBOX_POLL_SECONDS)
+            self.wakeup.clear()
+
+@st.cache_resource
+def get_outbox():
+    """The process-wide outbox, with its background worker thread started on first use.
+
+    main.py calls this when the server starts, so mail queued before a restart doesn't wait for new mail.
+    """
+    outbox = Outbox()
+    outbox.start()
+    return outbox
+
+def queue_email(msg, description):
+    try:
+        get_outbox().put(msg, description)
+        logging.info(f"Queued {description} to {msg['To']}")
+        return True
+    except Exception as e:
+        logging.error(f"Failed to queue {description} to {msg['To']}: {str(e)}")
+        return False
+
+def queue_diagnosis_email(recipient_email, username, disease, symptoms, treatment_pdf_data, illness_pdf_data):
+    """Like send_diagnosis_email, but returns as soon as the message is safely on disk."""
+    settings = smtp_settings()
+    if not settings["sender_email"] or not settings["sender_password"]:
+        logging.error("Missing SMTP credentials")
+        return False, "Email configuration is missing."
+    msg = build_diagnosis_email(settings["sender_email"], recipient_email, username, disease, symptoms, treatment_pdf_data, illness_pdf_data)
+    if not queue_email(msg, "diagnosis email"):
+        return False, "Failed to queue email."
+    return True, "Your reports are on their way to your inbox!"
+
+def queue_confirmation_email(recipient_email, username, token):
+    """Like send_confirmation_email, but returns as soon as the message is safely on disk."""
+    settings = smtp_settings()
+    if not settings["sender_email"] or not settings["sender_password"]:
+        logging.error("Missing SMTP credentials")
+        return False, "Email configuration is missing."
+    msg = build_confirmation_email(settings["sender_email"], recipient_email, username, token)
+    if not queue_email(msg, "confirmation email"):
+        return False, "Failed to queue confirmation email."
+    return True, "Confirmation email queued!"
+
+def generate_confirmation_token():
+    return str(uuid.uuid4())
+
+def store_pending_user(username, password, email, token):
+    try:
+        from user_manager import add_pending_user
+        timestamp = datetime.datetime.now(pytz.timezone('Asia/Colombo')).strftime("%Y-%m-%d %H:%M:%S")
+        stored = add_pending_user({
+            "username": username,
+            "password": password,  # Store plain text password
+            "email": email,
+            "token": token,
+            "timestamp": timestamp
+        })
+        if not stored:
+            return False, "Username or email already pending confirmation!"
+        
+        logging.info(f"Stored pending user: {username}")
+        return True, "Pending user stored!"
+    except Exception as e:
+        logging.error(f"Failed to store pending user {username}: {str(e)}")
+        return False, f"Failed to store pending user: {str(e)}"
+
+def confirm_user(username, token):
+    try:
+        from user_manager import get_pending_user, activate_pending_user
+        user = get_pending_user(username)
+        if user and user['token'] == token:
+            user_time = datetime.datetime.strptime(user['timestamp'], "%Y-%m-%d %H:%M:%S")
+            user_time = pytz.timezone('Asia/Colombo').localize(user_time)
+            current_time = datetime.datetime.now(pytz.timezone('Asia/Colombo'))
+            if (current_time - user_time).total_seconds() > 24 * 3600:
+                logging.warning(f"Expired token for {username}")
+                return False, "Confirmation token expired."
+            
+            if not activate_pending_user(user):
+                logging.warning(f"Username {username} or email already exists")
+                return False, "Username or email already exists!"
+            
+            logging.info(f"Confirmed user: {username}")
+            return True, "Account confirmed!"
+        
+        logging.warning(f"Invalid confirmation for {username}")
+        return False, "Invalid username or token."
+    except Exception as e:
+        logging.error(f"Failed to confirm user {username}: {str(e)}")
+        return False, f"Failed to confirm user: {str(e)}"
@@ -1,54 +1,44 @@
-import json
-import base64
-import datetime
-import streamlit as st
-from constants import TIMEZONE
-
-@st.cache_data(ttl=300)
-def load_user_history():
-    try:
-        with open('user_history.json', 'r') as file:
-            data = json.load(file)
-            return data.get('users', [])
-    except FileNotFoundError:
-        save_user_history([])
-        return []
-    except json.JSONDecodeError:
-        st.error("Invalid JSON format in user_history.json!")
-        return []
-
-def save_user_history(users):
-    try:
-        with open('user_history.json', 'w') as file:
-            json.dump({"users": users}, file, indent=2)
-        load_user_history.clear()
-    except Exception as e:
-        st.error(f"Error saving user history: {str(e)}")
-
-def add_user_illness(username, disease, symptoms, treatment_pdf_data, illness_pdf_data):
-    history = load_user_history()
-    user_entry = next((u for u in history if u['username'] == username), None)
-    timestamp = datetime.datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
-    
-    illness_entry = {
-        "disease": disease,
-        "timestamp": timestamp,
-        "symptoms": symptoms,
-        "treatment_pdf": base64.b64encode(treatment_pdf_data.getvalue()).decode('utf-8'),
-        "illness_pdf": base64.b64encode(illness_pdf_data.getvalue()).decode('utf-8')
-    }
-    
-    if user_entry:
-        user_entry['illnesses'].append(illness_entry)
-    else:
-        history.append({
-            "username": username,
-            "illnesses": [illness_entry]
-        })
-    
-    save_user_history(history)
-
-def get_user_illness_history(username):
-    history = load_user_history()
-    user_entry = next((u for u in history if u['username'] == username), None)
-    return user_entry['illnesses'] if user_entry else []
\ No newline at end of file
+import datetime
+import streamlit as st
+from constants import TIMEZONE
+from blob_store import blob_lock, put_blob, get_blob
+from storage import get_storage
+
+def load_user_history():
+    return get_storage().load_history()
+
+def save_user_history(users):
+    try:
+        get_storage().save_history(users)
+    except Exception as e:
+        st.error(f"Error saving user history: {str(e)}")
+
+def add_user_illness(username, disease, symptoms, treatment_pdf_data, illness_pdf_data):
+    timestamp = datetime.datetime.now(TIMEZONE).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Until the entry is saved; see blob_lock().
+    with blob_lock():
+        illness_entry = {
+            "disease": disease,
+            "timestamp": timestamp,
+            "symptoms": symptoms,
+            "treatment_pdf_blob": put_blob(treatment_pdf_data.getvalue()),
+            "illness_pdf_blob": put_blob(illness_pdf_data.getvalue())
+        }
+
+        get_storage().add_illness(username, illness_entry)
+
+def delete_user_history(username):
+    """Drop every history entry of `username` (case-insensitive)."""
+    get_storage().delete_history(username)
+
+def get_user_illness_history(username):
+    return get_storage().get_illnesses(username)
+
+def get_user_illness_page(username, page, page_size):
+    """Page `page` (0-based) of `username`'s history, newest first, and the total number of entries."""
+    return get_storage().get_illness_page(username, page * page_size, page_size)
+
+def get_illness_pdf(illness, kind):
+    """PDF bytes of one history entry's "treatment" or "illness" report."""
+    return get_blob(illness[f"{kind}_pdf_blob"])
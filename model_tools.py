@@ -0,0 +1,177 @@
+"""Offline maintenance commands for the model files in aimodels/.
+
+    python model_tools.py convert-mmap   # write the mmap-able FlatForest arrays
+    python model_tools.py distill-lookup # write and verify the per-input lookup artifact
+    python model_tools.py rss            # compare worker memory for each model format
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from ai import MODEL_DIR, FLAT_FOREST_DIR, LOOKUP_DIR, INPUT_GRID, FlatForest, LookupModel, PredictionTable, DiseasePredictor
+
+SAMPLE_PATIENT = {
+    'Fever': 'Yes',
+    'Cough': 'No',
+    'Fatigue': 'Yes',
+    'Difficulty Breathing': 'No',
+    'Headache': 'Yes',
+    'Rash': 'No',
+    'Nausea': 'No',
+    'Joint Pain': 'No',
+    'Weight Change': 'No',
+    'Age': 30,
+    'Gender': 'Male',
+    'Blood Pressure': 'Normal',
+    'Cholesterol Level': 'Normal'
+}
+
+def memory_snapshot():
+    """Rss/Pss/private/shared figures for this process from /proc/self/smaps_rollup, in bytes."""
+    fields = {'Rss:': 'rss', 'Pss:': 'pss', 'Shared_Clean:': 'shared_clean', 'Private_Clean:': 'private_clean', 'Private_Dirty:': 'private_dirty'}
+    snapshot = {}
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[0] in fields:
+                snapshot[fields[parts[0]]] = int(parts[1]) * 1024
+    snapshot['private'] = snapshot.get('private_clean', 0) + snapshot.get('private_dirty', 0)
+    return snapshot
+
+def random_encoded_rows(model, feature_encoders, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name in model.feature_names_in_:
+        if name in feature_encoders:
+            columns[name] = rng.integers(0, len(feature_encoders[name].classes_), n_rows)
+        else:
+            columns[name] = rng.integers(20, 81, n_rows)
+    return pd.DataFrame(columns)
+
+def convert_mmap(model_dir, n_check_rows=20000):
+    start = time.perf_counter()
+    model = joblib.load(os.path.join(model_dir, 'disease_predictor.joblib'))
+    feature_encoders = joblib.load(os.path.join(model_dir, 'feature_encoders.joblib'))
+    print(f"Loaded {len(model.estimators_)} trees in {time.perf_counter() - start:.2f}s")
+
+    path = os.path.join(model_dir, FLAT_FOREST_DIR)
+    FlatForest.save(model, path)
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    print(f"Wrote {path} ({size / (1024 * 1024):.1f} MB)")
+
+    flat = FlatForest(path)
+    X = random_encoded_rows(model, feature_encoders, n_check_rows)
+    expected = model.predict_proba(X)
+    actual = flat.predict_proba(X)
+    agreement = np.mean(model.predict(X) == flat.predict(X))
+    print(f"Checked {n_check_rows} rows: label agreement {agreement:.2%}, max |proba diff| {np.max(np.abs(expected - actual)):.3g}")
+    if agreement < 1.0:
+        sys.exit("FlatForest does not reproduce the original model; do not deploy it.")
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def distill_lookup(model_dir, top_k, chunk_size=50000, n_latency_rows=2000):
+    source = DiseasePredictor(model_dir, 'joblib')
+    path = os.path.join(model_dir, LOOKUP_DIR)
+    start = time.perf_counter()
+    LookupModel.save(source, path, top_k, chunk_size)
+    table = PredictionTable(source.encoder)
+    print(f"Evaluated {len(table)} grid points and wrote {path} in {time.perf_counter() - start:.1f}s")
+
+    # Check against the forest's own predict_proba, not the predictor's fast path the artifact was built with.
+    lookup = LookupModel(path)
+    label_mismatches = topk_mismatches = 0
+    max_proba_diff = 0.0
+    for start in range(0, len(table), chunk_size):
+        stop = min(start + chunk_size, len(table))
+        X = pd.DataFrame(table.rows(start, stop), columns=source.encoder.feature_names)
+        proba = source.model.predict_proba(X)
+        expected = source.model.classes_.take(np.argmax(proba, axis=1))
+        order = np.argsort(-proba, axis=1, kind='stable')[:, :lookup.topk_classes.shape[1]]
+        index = lookup._index(X)
+        label_mismatches += int(np.count_nonzero(lookup.predict(X) != expected))
+        topk_mismatches += int(np.count_nonzero(np.any(lookup.topk_classes[index] != order, axis=1)))
+        max_proba_diff = max(max_proba_diff, float(np.max(np.abs(lookup.topk_proba[index] - np.take_along_axis(proba, order, axis=1)))))
+    print(f"Full grid: {len(table) - label_mismatches}/{len(table)} labels agree, "
+          f"{len(table) - topk_mismatches}/{len(table)} top-{lookup.topk_classes.shape[1]} rankings agree, "
+          f"max |proba diff| {max_proba_diff:.3g}")
+    if label_mismatches or topk_mismatches:
+        sys.exit("The lookup artifact does not reproduce the original model; do not deploy it.")
+
+    rng = np.random.default_rng(0)
+    patients = [{col: values[rng.integers(len(values))] for col, values in INPUT_GRID.items()} for _ in range(n_latency_rows)]
+    sizes = {
+        'joblib': os.path.getsize(os.path.join(model_dir, 'disease_predictor.joblib')),
+        'lookup': directory_size(path),
+    }
+    for model_format in ('joblib', 'lookup'):
+        predictor = source if model_format == 'joblib' else DiseasePredictor(model_dir, model_format)
+        timings = []
+        for patient in patients:
+            start = time.perf_counter()
+            predictor.predict_topk(patient, top_k)
+            timings.append(time.perf_counter() - start)
+        print(f"{model_format:>6}: {sizes[model_format] / (1024 * 1024):.1f} MB on disk, "
+              f"load {predictor.load_stats['load_seconds'] * 1000:.0f} ms, "
+              f"uncached predict_topk p50 {np.percentile(timings, 50) * 1000:.3f} ms, p99 {np.percentile(timings, 99) * 1000:.3f} ms")
+
+def _probe(model_dir, model_format):
+    """Child process for `rss`: load, predict once, wait for the parent, then report memory."""
+    predictor = DiseasePredictor(model_dir, model_format)
+    predictor.predict_disease(SAMPLE_PATIENT)
+    print("ready", flush=True)
+    sys.stdin.readline()
+    print(json.dumps(memory_snapshot()), flush=True)
+
+def compare_rss(model_dir, workers):
+    formats = [name for name, path in (('joblib', None), ('mmap', FLAT_FOREST_DIR), ('lookup', LOOKUP_DIR))
+               if path is None or os.path.isdir(os.path.join(model_dir, path))]
+    for model_format in formats:
+        procs = [
+            subprocess.Popen(
+                [sys.executable, __file__, '_probe', '--model-dir', model_dir, '--format', model_format],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+            )
+            for _ in range(workers)
+        ]
+        # Measure only once every worker is loaded, so Pss reflects the pages they share.
+        for proc in procs:
+            while proc.stdout.readline().strip() != 'ready':
+                if proc.poll() is not None:
+                    sys.exit(f"{model_format} worker exited with status {proc.returncode}")
+        snapshots = []
+        for proc in procs:
+            proc.stdin.write("\n")
+            proc.stdin.flush()
+            snapshots.append(json.loads(proc.stdout.readline()))
+            proc.wait()
+        mb = lambda key: sum(s[key] for s in snapshots) / len(snapshots) / (1024 * 1024)
+        print(f"{model_format:>6}: {workers} workers, per worker Rss {mb('rss'):.1f} MB, "
+              f"Pss {mb('pss'):.1f} MB, private {mb('private'):.1f} MB, shared {mb('shared_clean'):.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="HeyDoc model maintenance")
+    parser.add_argument('command', choices=['convert-mmap', 'distill-lookup', 'rss', '_probe'])
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--format', default='joblib')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'convert-mmap':
+        convert_mmap(args.model_dir)
+    elif args.command == 'distill-lookup':
+        distill_lookup(args.model_dir, args.top_k)
+    elif args.command == 'rss':
+        compare_rss(args.model_dir, args.workers)
+    else:
+        _probe(args.model_dir, args.format)
+
+if __name__ == "__main__":
+    main()
@@ -1,141 +1,260 @@
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.graphics.shapes import Drawing, Line
-from reportlab.lib.colors import HexColor
-from reportlab.lib.utils import ImageReader
-from io import BytesIO
-import datetime
-from constants import TIMEZONE
-
-def add_watermark(canvas, doc, watermark_path, opacity=0.2):
-    if watermark_path:
-        watermark = ImageReader(watermark_path)
-        canvas.saveState()
-        if hasattr(canvas, 'setFillAlpha'):
-            canvas.setFillAlpha(opacity)
-        else:
-            canvas.setAlpha(opacity)
-        canvas.drawImage(watermark, x=150, y=300, width=300, height=300, mask='auto')
-        canvas.restoreState()
-
-def generate_treatment_pdf(disease, disease_data, username):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.5*inch, rightMargin=0.5*inch)
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'Title', parent=styles['Heading1'], fontSize=20, spaceAfter=12, textColor=HexColor('#1e293b'), fontName='Helvetica-Bold', alignment=1
-    )
-    section_style = ParagraphStyle(
-        'Section', parent=styles['Heading2'], fontSize=14, spaceBefore=12, spaceAfter=6, textColor=HexColor('#3b82f6'), fontName='Helvetica-Bold'
-    )
-    body_style = ParagraphStyle(
-        'Body', parent=styles['Normal'], fontSize=12, spaceAfter=6, textColor=HexColor('#0f172a'), leading=14
-    )
-    
-    story = []
-    story.append(Paragraph("HeyDoc Treatment Plan Report", title_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    today = datetime.datetime.now(TIMEZONE).strftime("%B %d, %Y, %H:%M +0530")
-    story.append(Paragraph(f"Generated for: {username}", body_style))
-    story.append(Paragraph(f"Date: {today}", body_style))
-    story.append(Paragraph(f"Report by {username} by HeyDoc on {today}", body_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    drawing = Drawing(400, 1)
-    drawing.add(Line(0, 0, 400, 0, strokeColor=HexColor('#334155'), strokeWidth=1))
-    story.append(drawing)
-    story.append(Spacer(1, 0.2*inch))
-    
-    story.append(Paragraph("Predicted Condition", section_style))
-    story.append(Paragraph(disease, body_style))
-    story.append(Spacer(1, 0.1*inch))
-    
-    if disease_data and "treatment" in disease_data:
-        story.append(Paragraph("Treatment Plan", section_style))
-        for treatment in disease_data["treatment"]:
-            story.append(Paragraph(f"• {treatment}", body_style))
-        story.append(Spacer(1, 0.1*inch))
-    
-    if disease_data and "prevention" in disease_data:
-        story.append(Paragraph("Prevention Tips", section_style))
-        for prevention in disease_data["prevention"]:
-            story.append(Paragraph(f"• {prevention}", body_style))
-        story.append(Spacer(1, 0.1*inch))
-    
-    story.append(Paragraph("When to See a Doctor", section_style))
-    story.append(Paragraph("Consult a healthcare provider if symptoms persist or worsen.", body_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    doc.build(story, onFirstPage=lambda c, d: add_watermark(c, d, "heydoc-high-resolution-logo.png"), 
-             onLaterPages=lambda c, d: add_watermark(c, d, "heydoc-high-resolution-logo.png"))
-    
-    buffer.seek(0)
-    return buffer
-
-def generate_illness_pdf(disease, disease_data, username):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.5*inch, rightMargin=0.5*inch)
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'Title', parent=styles['Heading1'], fontSize=20, spaceAfter=12, textColor=HexColor('#1e293b'), fontName='Helvetica-Bold', alignment=1
-    )
-    section_style = ParagraphStyle(
-        'Section', parent=styles['Heading2'], fontSize=14, spaceBefore=12, spaceAfter=6, textColor=HexColor('#3b82f6'), fontName='Helvetica-Bold'
-    )
-    body_style = ParagraphStyle(
-        'Body', parent=styles['Normal'], fontSize=12, spaceAfter=6, textColor=HexColor('#0f172a'), leading=14
-    )
-    
-    story = []
-    story.append(Paragraph("HeyDoc Illness Information Report", title_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    today = datetime.datetime.now(TIMEZONE).strftime("%B %d, %Y, %H:%M +0530")
-    story.append(Paragraph(f"Generated for: {username}", body_style))
-    story.append(Paragraph(f"Date: {today}", body_style))
-    story.append(Paragraph(f"Report by {username} by HeyDoc on {today}", body_style))
-    story.append(Spacer(1, 0.2*inch))
-    
-    drawing = Drawing(400, 1)
-    drawing.add(Line(0, 0, 400, 0, strokeColor=HexColor('#334155'), strokeWidth=1))
-    story.append(drawing)
-    story.append(Spacer(1, 0.2*inch))
-    
-    story.append(Paragraph("Condition", section_style))
-    story.append(Paragraph(disease, body_style))
-    story.append(Spacer(1, 0.1*inch))
-    
-    if disease_data and "definition" in disease_data:
-        story.append(Paragraph("Description", section_style))
-        for desc in disease_data["definition"]:
-            story.append(Paragraph(f"• {desc}", body_style))
-        story.append(Spacer(1, 0.1*inch))
-    
-    if disease_data and "symptoms" in disease_data:
-        story.append(Paragraph("Common Symptoms", section_style))
-        for symptom in disease_data["symptoms"]:
-            story.append(Paragraph(f"• {symptom}", body_style))
-        story.append(Spacer(1, 0.1*inch))
-    
-    if disease_data and "causes" in disease_data:
-        story.append(Paragraph("Causes", section_style))
-        for cause in disease_data["causes"]:
-            story.append(Paragraph(f"• {cause}", body_style))
-        story.append(Spacer(1, 0.1*inch))
-    
-    if disease_data and "risk_factors" in disease_data:
-        story.append(Paragraph("Risk Factors", section_style))
-        for risk in disease_data["risk_factors"]:
-            story.append(Paragraph(f"• {risk}", body_style))
-        story.append(Spacer(1, 0.1*inch))
-    
-    doc.build(story, onFirstPage=lambda c, d: add_watermark(c, d, "heydoc-high-resolution-logo.png"), 
-             onLaterPages=lambda c, d: add_watermark(c, d, "heydoc-high-resolution-logo.png"))
-    
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Flowable, Frame
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.graphics.shapes import Drawing, Line
+from reportlab.lib.colors import HexColor
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfdoc import xObjectName
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import NameObject
+from io import BytesIO
+from xml.sax.saxutils import escape
+import datetime
+import functools
+import json
+import os
+from constants import TIMEZONE
+
+LOGO_PATH = "heydoc-high-resolution-logo.png"
+WATERMARK_SIZE = 300
+# Pixels kept per point of watermark; the 1504px source logo is far more than a 300pt mark can show.
+WATERMARK_PIXELS_PER_POINT = 2
+# Pre-rendered report bodies kept per template; there are 72 diseases in disease_info.json.
+BODY_CACHE_SIZE = 256
+
+def _build_styles():
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle(
+            'Title', parent=styles['Heading1'], fontSize=20, spaceAfter=12, textColor=HexColor('#1e293b'), fontName='Helvetica-Bold', alignment=1
+        ),
+        "section": ParagraphStyle(
+            'Section', parent=styles['Heading2'], fontSize=14, spaceBefore=12, spaceAfter=6, textColor=HexColor('#3b82f6'), fontName='Helvetica-Bold'
+        ),
+        "body": ParagraphStyle(
+            'Body', parent=styles['Normal'], fontSize=12, spaceAfter=6, textColor=HexColor('#0f172a'), leading=14
+        ),
+    }
+
+# Styles are never mutated while building a report, so one set is shared by every PDF.
+STYLES = _build_styles()
+
+@functools.lru_cache(maxsize=None)
+def _watermark_image(watermark_path):
+    """The watermark decoded and downscaled once per process, shared by every report."""
+    with Image.open(watermark_path) as img:
+        img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        max_pixels = WATERMARK_SIZE * WATERMARK_PIXELS_PER_POINT
+        img.thumbnail((max_pixels, max_pixels), Image.LANCZOS)
+    return ImageReader(img)
+
+def add_watermark(canvas, doc, watermark_path, opacity=0.2):
+    if watermark_path:
+        # Draw the image into a form XObject on the first page and reference it from every later one.
+        watermark = _watermark_image(watermark_path)
+        form_name = f"watermark_{id(watermark)}"
+        if not canvas.hasForm(form_name):
+            canvas.beginForm(form_name)
+            canvas.drawImage(watermark, x=150, y=300, width=WATERMARK_SIZE, height=WATERMARK_SIZE, mask='auto')
+            canvas.endForm()
+        canvas.saveState()
+        if hasattr(canvas, 'setFillAlpha'):
+            canvas.setFillAlpha(opacity)
+        else:
+            canvas.setAlpha(opacity)
+        canvas.doForm(form_name)
+        canvas.restoreState()
+
+def _stacked_height(flowables, width):
+    """Height a frame uses to stack `flowables`, excluding the last one's space after."""
+    height = 0
+    for flowable in flowables:
+        height += flowable.wrap(width, 10000)[1] + flowable.getSpaceAfter()
+    return height - flowables[-1].getSpaceAfter()
+
+class StampablePdf:
+    """A finished PDF whose header slot can be filled in through a PDF incremental update.
+
+    The first page draws an empty form XObject, HeaderSlot.FORM_NAME, where the header
+    goes. `stamp` takes the form of the same name from an overlay PDF, clones it with
+    every object it references (fonts, font files, images) into pypdf's incremental
+    writer, which renumbers them past the original's objects, and points the page's
+    resource entry at the clone. Only those objects and the changed resource dictionary
+    are appended to the unchanged original bytes.
+    """
+    FORM_NAME = '/' + xObjectName("HeyDocHeader")
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+
+    def stamp(self, overlay_pdf):
+        """The original PDF with the header form of `overlay_pdf` in place of its empty one."""
+        writer = PdfWriter(BytesIO(self.pdf), incremental=True)
+        overlay_forms = PdfReader(BytesIO(overlay_pdf)).pages[0]['/Resources']['/XObject']
+        xobjects = writer.pages[0]['/Resources']['/XObject']
+        xobjects[NameObject(self.FORM_NAME)] = overlay_forms.raw_get(self.FORM_NAME).clone(writer)
+        out = BytesIO()
+        writer.write(out)
+        return out.getvalue()
+
+class HeaderSlot(Flowable):
+    """Reserves the space of a report header, draws an empty header form there for
+    StampablePdf to replace, and remembers where the slot was drawn."""
+    FORM_NAME = "HeyDocHeader"
+
+    def __init__(self, header):
+        super().__init__()
+        self.header = header
+        self.spaceAfter = header[-1].getSpaceAfter()
+        self.box = None
+
+    def wrap(self, availWidth, availHeight):
+        self.width = availWidth
+        self.height = _stacked_height(self.header, availWidth)
+        return self.width, self.height
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self.box = (x, y, self.width, self.height)
+        # Page-sized and drawn untransformed, so the header form replacing it keeps its page coordinates.
+        canvas.beginForm(self.FORM_NAME)
+        canvas.endForm()
+        canvas.doForm(self.FORM_NAME)
+
+    def draw(self):
+        pass
+
+class ReportTemplate:
+    """Page layout shared by the HeyDoc reports: title, per-user header, rule, then sections.
+
+    Everything except the header depends only on the disease, so `stamp` renders that body
+    once per disease with a blank slot for the header and, per request, only lays out the
+    three header lines on a one-page overlay that is appended to the cached PDF.
+    """
+    def __init__(self, title, condition_heading, sections, watermark_path=LOGO_PATH):
+        self.title = title
+        self.condition_heading = condition_heading
+        self.sections = sections
+        self.watermark_path = watermark_path
+
+    def header(self, username):
+        body_style = STYLES["body"]
+        today = datetime.datetime.now(TIMEZONE).strftime("%B %d, %Y, %H:%M +0530")
+        username = escape(username)
+        return [
+            Paragraph(f"Generated for: {username}", body_style),
+            Paragraph(f"Date: {today}", body_style),
+            Paragraph(f"Report by {username} by HeyDoc on {today}", body_style),
+        ]
+
+    def body(self, disease, disease_data):
+        section_style, body_style = STYLES["section"], STYLES["body"]
+        story = []
+        drawing = Drawing(400, 1)
+        drawing.add(Line(0, 0, 400, 0, strokeColor=HexColor('#334155'), strokeWidth=1))
+        story.append(drawing)
+        story.append(Spacer(1, 0.2*inch))
+
+        story.append(Paragraph(self.condition_heading, section_style))
+        # Paragraph text is reportlab markup, so "<130/80 mmHg" and "&" must be escaped.
+        story.append(Paragraph(escape(disease), body_style))
+        story.append(Spacer(1, 0.1*inch))
+
+        for key, heading in self.sections:
+            if disease_data and key in disease_data:
+                story.append(Paragraph(heading, section_style))
+                for item in disease_data[key]:
+                    story.append(Paragraph(f"• {escape(item)}", body_style))
+                story.append(Spacer(1, 0.1*inch))
+        return story
+
+    def footer(self):
+        return []
+
+    def _build(self, header, disease, disease_data):
+        buffer = BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.5*inch, rightMargin=0.5*inch)
+        story = [Paragraph(self.title, STYLES["title"]), Spacer(1, 0.2*inch)]
+        story.extend(header)
+        story.append(Spacer(1, 0.2*inch))
+        story.extend(self.body(disease, disease_data))
+        story.extend(self.footer())
+
+        on_page = lambda c, d: add_watermark(c, d, self.watermark_path)
+        doc.build(story, onFirstPage=on_page, onLaterPages=on_page)
+        return buffer.getvalue()
+
+    def render(self, disease, disease_data, username):
+        """Lay out the whole report from scratch."""
+        buffer = BytesIO(self._build(self.header(username), disease, disease_data))
+        buffer.seek(0)
+        return buffer
+
+    @functools.lru_cache(maxsize=BODY_CACHE_SIZE)
+    def _cached_body(self, disease, disease_data_json):
+        slot = HeaderSlot(self.header("HeyDoc"))
+        pdf = self._build([slot], disease, json.loads(disease_data_json))
+        return StampablePdf(pdf), slot.box
+
+    def stamp(self, disease, disease_data, username):
+        """The same report as `render`, built from the cached body plus a per-user header overlay."""
+        body, (x, y, width, height) = self._cached_body(disease, json.dumps(disease_data, sort_keys=True))
+        header = self.header(username)
+        # A username long enough to wrap changes the layout below it, so render those in full.
+        if abs(_stacked_height(header, width) - height) > 0.01:
+            return self.render(disease, disease_data, username)
+
+        overlay = BytesIO()
+        canvas = Canvas(overlay, pagesize=letter)
+        canvas.beginForm(HeaderSlot.FORM_NAME)
+        Frame(x, y, width, height, leftPadding=0, bottomPadding=0, rightPadding=0, topPadding=0).addFromList(header, canvas)
+        canvas.endForm()
+        canvas.doForm(HeaderSlot.FORM_NAME)
+        canvas.save()
+
+        return BytesIO(body.stamp(overlay.getvalue()))
+
+class TreatmentReportTemplate(ReportTemplate):
+    def __init__(self):
+        super().__init__(
+            "HeyDoc Treatment Plan Report", "Predicted Condition",
+            [("treatment", "Treatment Plan"), ("prevention", "Prevention Tips")]
+        )
+
+    def footer(self):
+        return [
+            Paragraph("When to See a Doctor", STYLES["section"]),
+            Paragraph("Consult a healthcare provider if symptoms persist or worsen.", STYLES["body"]),
+            Spacer(1, 0.2*inch),
+        ]
+
+TREATMENT_REPORT = TreatmentReportTemplate()
+ILLNESS_REPORT = ReportTemplate(
+    "HeyDoc Illness Information Report", "Condition",
+    [("definition", "Description"), ("symptoms", "Common Symptoms"), ("causes", "Causes"), ("risk_factors", "Risk Factors")]
+)
+
+def prerender_reports(disease_info):
+    """Fill the body caches for every disease up front instead of on first use."""
+    for disease, disease_data in disease_info.items():
+        for template in (TREATMENT_REPORT, ILLNESS_REPORT):
+            template._cached_body(disease, json.dumps(disease_data, sort_keys=True))
+
+def generate_treatment_pdf(disease, disease_data, username):
+    return TREATMENT_REPORT.stamp(disease, disease_data, username)
+
+def generate_illness_pdf(disease, disease_data, username):
+    return ILLNESS_REPORT.stamp(disease, disease_data, username)
+
+
+def render_reports(disease, disease_data, username):
+    """Render the treatment and illness reports; returns their PDF bytes.
+
+    Rendering is synchronous: the history save and the email that follow both need
+    the finished PDFs, so nothing could run alongside it, and with the body cache
+    stamping a report takes a few milliseconds.
+    """
+    return (generate_treatment_pdf(disease, disease_data, username).getvalue(),
+            generate_illness_pdf(disease, disease_data, username).getvalue())
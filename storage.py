@@ -0,0 +1,916 @@
+"""Persistence for users, pending users and illness history.
+
+HEYDOC_STORAGE selects the backend: "json" (default) keeps users.json,
+pending_users.json and one history journal per user under user_history/; "sqlite" keeps everything
+in one SQLite database. Both backends expose the same methods, and the managers
+only talk to get_storage().
+
+    python storage.py import-json       # copy the JSON files into HEYDOC_DB
+    python storage.py migrate-history   # split user_history.json into user_history/, PDFs into blobs/
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+import streamlit as st
+from blob_store import blob_lock, delete_blobs, put_blob
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still atomic, compaction just isn't locked against other processes
+    fcntl = None
+
+STORAGE_BACKEND = os.getenv("HEYDOC_STORAGE", "json")
+DB_PATH = os.getenv("HEYDOC_DB", "heydoc.db")
+USERS_FILE = 'users.json'
+PENDING_USERS_FILE = 'pending_users.json'
+HISTORY_DIR = os.getenv("HISTORY_DIR", "user_history")
+# Earlier layouts: the single journal shared by all users, and before it the whole-file JSON.
+HISTORY_JOURNAL = os.getenv("HISTORY_JOURNAL", "user_history.jsonl")
+LEGACY_HISTORY_FILE = 'user_history.json'
+PDF_KINDS = ("treatment", "illness")
+# Compact once the journal holds this many records and more than half of them are dead.
+COMPACT_MIN_RECORDS = 1000
+USER_FIELDS = ('password', 'email', 'is_admin', 'usage_count')
+
+def username_key(username):
+    """Usernames are unique regardless of case; this is the form they are looked up by."""
+    return username.casefold()
+
+def activated_user(pending_user):
+    """The account a confirmed or approved sign-up becomes."""
+    return {"username": pending_user['username'], "password": pending_user['password'], "email": pending_user['email'],
+            "is_admin": False, "usage_count": 0}
+
+def _migrate_inline_pdfs(users):
+    """Move base64 PDFs stored inline by older versions into the blob store; True if anything moved."""
+    migrated = False
+    for user in users:
+        for illness in user['illnesses']:
+            for kind in PDF_KINDS:
+                inline = illness.pop(f"{kind}_pdf", None)
+                if inline is not None:
+                    illness[f"{kind}_pdf_blob"] = put_blob(base64.b64decode(inline))
+                    migrated = True
+    return migrated
+
+def _blob_digests(users):
+    """Digests of every PDF blob the entries of `users` (a load_user_history() list) refer to."""
+    return {illness[f"{kind}_pdf_blob"] for user in users for illness in user['illnesses'] for kind in PDF_KINDS
+            if illness.get(f"{kind}_pdf_blob")}
+
+def _journal_header():
+    return (json.dumps({"op": "header", "id": uuid.uuid4().hex}) + '\n').encode('utf-8')
+
+class HistoryJournal:
+    """Append-only JSON Lines log of history records with an in-memory per-user index.
+
+    Each line is {"op": "add", "username": ..., "illness": {...}} or
+    {"op": "delete", "username": ...}. Writes append one line under an exclusive
+    lock and fsync it; reads only parse what was appended since the last read.
+    Compaction rewrites the live entries to a new file and renames it into place.
+    Every file starts with a {"op": "header", "id": ...} line unique to it, and other
+    processes reload when the inode or that first line changes: the file system
+    may hand the replaced file's inode number straight to the next one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.users = {}
+        self.offset = 0
+        self.inode = None
+        self.head = None
+        self.records = 0
+        self.live = 0
+
+    def _apply(self, record):
+        if record['op'] == 'header':
+            return
+        self.records += 1
+        if record['op'] == 'add':
+            self.users.setdefault(record['username'], []).append(record['illness'])
+            self.live += 1
+        elif record['op'] == 'delete':
+            target = username_key(record['username'])
+            for username in [u for u in self.users if username_key(u) == target]:
+                self.live -= len(self.users.pop(username))
+
+    def refresh(self):
+        """Apply records appended since the last call; reload from scratch if the file was replaced."""
+        with self._lock:
+            try:
+                file = open(self.path, 'rb')
+            except FileNotFoundError:
+                self._reset()
+                return
+            with file:
+                stat = os.fstat(file.fileno())
+                head = file.readline()
+                if stat.st_ino != self.inode or stat.st_size < self.offset or head != self.head:
+                    self._reset()
+                    self.inode, self.head = stat.st_ino, head
+                if stat.st_size == self.offset:
+                    return
+                file.seek(self.offset)
+                data = file.read()
+            # A line without its newline is still being written; leave it for the next refresh.
+            complete = data[:data.rfind(b'\n') + 1]
+            for line in complete.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    self._apply(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    st.error(f"Skipping corrupt record in {self.path}!")
+            self.offset += len(complete)
+
+    def _open_locked(self):
+        """Open the journal for appending with an exclusive lock on the file that is currently in place."""
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            if fcntl is None:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Compaction may have renamed a new file over the one we opened while we waited,
+            # or the file may have been deleted along with its user.
+            try:
+                stat = os.fstat(fd)
+                if stat.st_ino == os.stat(self.path).st_ino:
+                    if stat.st_size == 0:
+                        os.write(fd, _journal_header())
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def append(self, record):
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        with self._lock:
+            fd = self._open_locked()
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self.refresh()
+            if self.records >= COMPACT_MIN_RECORDS and self.records > 2 * self.live:
+                self.compact()
+
+    def compact(self, users=None):
+        """Rewrite the journal with only live entries, or with `users` (a load_user_history() list) if given."""
+        with self._lock:
+            fd = self._open_locked()
+            try:
+                if users is None:
+                    self.refresh()
+                    users = self.snapshot()
+                self._write_snapshot(users, os.replace)
+            finally:
+                os.close(fd)
+            self.refresh()
+
+    def _write_snapshot(self, users, install):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write(_journal_header().decode('utf-8'))
+            for user in users:
+                for illness in user['illnesses']:
+                    file.write(json.dumps({"op": "add", "username": user['username'], "illness": illness}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        try:
+            install(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def snapshot(self):
+        with self._lock:
+            return [{"username": username, "illnesses": list(illnesses)} for username, illnesses in self.users.items()]
+
+    def get(self, username):
+        with self._lock:
+            return list(self.users.get(username, []))
+
+    def page(self, username, offset, limit):
+        """`limit` entries of `username`, newest first, skipping the `offset` newest; plus the total count."""
+        with self._lock:
+            illnesses = self.users.get(username, [])
+            end = max(len(illnesses) - offset, 0)
+            return illnesses[max(end - limit, 0):end][::-1], len(illnesses)
+
+class ShardedHistory:
+    """One HistoryJournal per user in `directory`, so a dashboard reads only its own user's file
+    and deleting a user's history is a single unlink.
+
+    Shards are named after username_key(), so case variants of a name share a file
+    while entries still keep the exact username they were saved under.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._journals = {}
+        if not os.path.isdir(directory):
+            self._import_legacy()
+
+    def shard_path(self, username):
+        return os.path.join(self.directory, quote(username_key(username), safe='') + '.jsonl')
+
+    def journal(self, username):
+        path = self.shard_path(username)
+        with self._lock:
+            if path not in self._journals:
+                self._journals[path] = HistoryJournal(path)
+            return self._journals[path]
+
+    def add(self, username, illness):
+        self.journal(username).append({"op": "add", "username": username, "illness": illness})
+
+    def get(self, username):
+        journal = self.journal(username)
+        journal.refresh()
+        return journal.get(username)
+
+    def page(self, username, offset, limit):
+        journal = self.journal(username)
+        journal.refresh()
+        return journal.page(username, offset, limit)
+
+    def delete(self, username):
+        """Unlink `username`'s shard, then every blob of theirs that no other shard refers to."""
+        with blob_lock():
+            journal = self.journal(username)
+            journal.refresh()
+            digests = _blob_digests(journal.snapshot())
+            try:
+                os.unlink(self.shard_path(username))
+            except FileNotFoundError:
+                pass
+            if digests:
+                delete_blobs(digests - _blob_digests(self.load()))
+
+    def load(self):
+        users = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.jsonl'):
+                journal = self.journal(unquote(name[:-len('.jsonl')]))
+                journal.refresh()
+                users.extend(journal.snapshot())
+        return users
+
+    def save(self, users):
+        """Replace all history with `users` (a load_user_history() list); blobs only the old history used are removed."""
+        shards = {}
+        for user in users:
+            shards.setdefault(self.shard_path(user['username']), []).append(user)
+        with blob_lock():
+            dropped = _blob_digests(self.load()) - _blob_digests(users)
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith('.jsonl') and path not in shards:
+                    os.unlink(path)
+            for path, shard_users in shards.items():
+                self.journal(shard_users[0]['username']).compact(shard_users)
+            delete_blobs(dropped)
+
+    def _import_legacy(self):
+        """Split the shared journal (or the user_history.json before it) into per-user shards.
+
+        The shards are written to a temporary directory that is renamed into place,
+        so concurrent processes either see no shards yet or all of them.
+        """
+        if os.path.exists(HISTORY_JOURNAL):
+            legacy = HistoryJournal(HISTORY_JOURNAL)
+            legacy.refresh()
+            users = legacy.snapshot()
+        else:
+            try:
+                with open(LEGACY_HISTORY_FILE, 'r') as file:
+                    users = json.load(file).get('users', [])
+            except FileNotFoundError:
+                users = []
+            except json.JSONDecodeError:
+                st.error(f"Invalid JSON format in {LEGACY_HISTORY_FILE}!")
+                users = []
+            _migrate_inline_pdfs(users)
+
+        parent = os.path.dirname(os.path.abspath(self.directory))
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(self.directory)}.")
+        for user in users:
+            HistoryJournal(os.path.join(tmp_dir, os.path.basename(self.shard_path(user['username']))))._write_snapshot([user], os.replace)
+        try:
+            os.rename(tmp_dir, self.directory)
+        except OSError:
+            # Another process finished its import first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+@contextmanager
+def file_lock(path):
+    """Exclusive cross-process lock on `path`, held through a `<path>.lock` sidecar file.
+
+    The sidecar is what gets locked because atomic_write_json replaces the data
+    file itself, and a lock on a replaced inode protects nothing.
+    """
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def atomic_write_json(path, data):
+    """Write `data` to a temp file beside `path`, fsync it and rename it over `path`.
+
+    Readers see either the old file or the new one, never a torn write.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f".{os.path.basename(path)}.")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            json.dump(data, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+class IndexedJsonFile:
+    """A {"<key>": [records]} file such as users.json, held in memory with dicts keyed
+    by username_key() and by email so lookups don't scan the list.
+
+    The index is rebuilt when the file's inode, size or mtime changes (another
+    process saved it). The file the index was read from is kept open, so its inode
+    number can't be reused by a later replacement that also matches its size and
+    mtime. Every change goes through transaction(), which holds
+    file_lock() while it re-reads, modifies and atomically rewrites the file, so
+    concurrent sessions and processes can't lose each other's updates. Lookups
+    return copies, so callers can't change the cached records behind its back.
+    """
+
+    def __init__(self, path, key):
+        self.path = path
+        self.key = key
+        self._lock = threading.RLock()
+        self._signature = None
+        self._held = None
+        self._index(self._read())
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _hold_current(self):
+        """Open the current file in place of the held one and take the signature from it; None if there is none."""
+        if self._held is not None:
+            self._held.close()
+        try:
+            self._held = open(self.path, 'r')
+        except FileNotFoundError:
+            self._held, self._signature = None, None
+            return None
+        stat = os.fstat(self._held.fileno())
+        self._signature = stat.st_ino, stat.st_size, stat.st_mtime_ns
+        return self._held
+
+    def _release(self):
+        # Windows can't replace a file another process holds open; there the signature alone has to do.
+        if os.name == 'nt' and self._held is not None:
+            self._held.close()
+            self._held = None
+
+    def _read(self, strict=False):
+        file = self._hold_current()
+        if file is None:
+            return []
+        try:
+            return json.load(file).get(self.key, [])
+        except json.JSONDecodeError:
+            # Never let a transaction save over a file it couldn't read.
+            if strict:
+                raise
+            st.error(f"Invalid JSON format in {self.path}!")
+            return []
+        finally:
+            self._release()
+
+    def _index(self, records):
+        self.records = records
+        self.by_username = {username_key(r['username']): r for r in records}
+        self.by_email = {}
+        for record in records:
+            self.by_email.setdefault(record['email'], []).append(record)
+
+    def _refresh(self, strict=False):
+        if self._stat_signature() != self._signature:
+            self._index(self._read(strict))
+
+    def load(self):
+        with self._lock:
+            self._refresh()
+            return [dict(r) for r in self.records]
+
+    def get(self, username):
+        with self._lock:
+            self._refresh()
+            record = self.by_username.get(username_key(username))
+            return dict(record) if record else None
+
+    def exists(self, username, email):
+        """True if a record has this username (case-insensitive) or this email."""
+        with self._lock:
+            self._refresh()
+            return username_key(username) in self.by_username or email in self.by_email
+
+    def email_in_use(self, email, exclude_username):
+        with self._lock:
+            self._refresh()
+            exclude = username_key(exclude_username)
+            return any(username_key(r['username']) != exclude for r in self.by_email.get(email, []))
+
+    @contextmanager
+    def transaction(self):
+        """Yield the current records as a list to modify in place; they are saved when the block exits cleanly."""
+        with self._lock, file_lock(self.path):
+            self._refresh(strict=True)
+            records = [dict(r) for r in self.records]
+            yield records
+            if records != self.records:
+                atomic_write_json(self.path, {self.key: records})
+                self._index(records)
+                self._hold_current()
+                self._release()
+
+    def save(self, records):
+        with self.transaction() as current:
+            current[:] = [dict(r) for r in records]
+
+    def insert(self, record):
+        """Append `record` unless its username or email is already taken; returns whether it was added."""
+        with self.transaction() as records:
+            if self.exists(record['username'], record['email']):
+                return False
+            records.append(dict(record))
+        return True
+
+    def update(self, username, change):
+        """Apply `change(record)` to the record for `username` and save; returns the saved record, or None if there is none.
+
+        `change` may modify the record in place or return a replacement for it. Either way it
+        runs inside the transaction, so a change computed from the record can't lose a concurrent one.
+        """
+        with self.transaction() as records:
+            index = next((i for i, r in enumerate(records) if username_key(r['username']) == username_key(username)), None)
+            if index is None:
+                return None
+            replacement = change(records[index])
+            if replacement is not None:
+                records[index] = replacement
+            return dict(records[index])
+
+    def remove(self, username):
+        with self.transaction() as records:
+            kept = [r for r in records if username_key(r['username']) != username_key(username)]
+            if len(kept) == len(records):
+                return False
+            records[:] = kept
+        return True
+
+class JsonStorage:
+    """users.json and pending_users.json rewritten whole on every change, history sharded per user."""
+
+    def __init__(self, history_dir=HISTORY_DIR):
+        if not os.path.exists(USERS_FILE):
+            atomic_write_json(USERS_FILE, {"users": []})
+        self.users = IndexedJsonFile(USERS_FILE, 'users')
+        self.pending_users = IndexedJsonFile(PENDING_USERS_FILE, 'pending_users')
+        self.history = ShardedHistory(history_dir)
+
+    # Users
+    def load_users(self):
+        return self.users.load()
+
+    def save_users(self, users):
+        self.users.save(users)
+
+    def get_user(self, username):
+        return self.users.get(username)
+
+    def user_exists(self, username, email):
+        return self.users.exists(username, email)
+
+    def add_user(self, user):
+        return self.users.insert(user)
+
+    def update_user(self, username, **fields):
+        return self.users.update(username, lambda user: user.update(fields))
+
+    def update_profile(self, username, **fields):
+        """Update `fields`, checking in the same transaction that a new email isn't another user's.
+
+        Returns True once saved, False if the email is taken, None if there is no such user.
+        """
+        with self.users.transaction() as users:
+            if 'email' in fields and self.users.email_in_use(fields['email'], username):
+                return False
+            user = next((u for u in users if username_key(u['username']) == username_key(username)), None)
+            if user is None:
+                return None
+            user.update(fields)
+        return True
+
+    def remove_user(self, username):
+        return self.users.remove(username)
+
+    def toggle_admin(self, username):
+        """Flip is_admin in one transaction; returns the new value, or None if there is no such user."""
+        user = self.users.update(username, lambda u: {**u, "is_admin": not u.get("is_admin", False)})
+        return user["is_admin"] if user else None
+
+    def increment_usage(self, username):
+        def increment(user):
+            if not user.get('is_admin', False):
+                user['usage_count'] = user.get('usage_count', 0) + 1
+        self.users.update(username, increment)
+
+    def reset_all_usage(self):
+        """Zero every non-admin usage count; returns how many non-admin users there are."""
+        with self.users.transaction() as users:
+            non_admins = [u for u in users if not u.get('is_admin', False)]
+            for user in non_admins:
+                user['usage_count'] = 0
+        return len(non_admins)
+
+    # Pending users
+    def load_pending_users(self):
+        return self.pending_users.load()
+
+    def get_pending_user(self, username):
+        return self.pending_users.get(username)
+
+    def pending_exists(self, username, email):
+        return self.pending_users.exists(username, email)
+
+    def add_pending_user(self, pending_user):
+        return self.pending_users.insert(pending_user)
+
+    def remove_pending_user(self, username):
+        return self.pending_users.remove(username)
+
+    def activate_pending_user(self, username):
+        """Move a pending sign-up into users while holding both files' locks; False if it is gone
+        or its username or email is taken by now."""
+        with self.pending_users.transaction() as pending, self.users.transaction() as users:
+            record = next((p for p in pending if username_key(p['username']) == username_key(username)), None)
+            if record is None or self.users.exists(record['username'], record['email']):
+                return False
+            # users.json is written first: a crash in between leaves the account active and the sign-up pending,
+            # never neither.
+            users.append(activated_user(record))
+            pending.remove(record)
+        return True
+
+    # History
+    def load_history(self):
+        return self.history.load()
+
+    def save_history(self, users):
+        self.history.save(users)
+
+    def add_illness(self, username, illness):
+        self.history.add(username, illness)
+
+    def get_illnesses(self, username):
+        return self.history.get(username)
+
+    def get_illness_page(self, username, offset, limit):
+        return self.history.page(username, offset, limit)
+
+    def delete_history(self, username):
+        self.history.delete(username)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    username_key TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    usage_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+
+CREATE TABLE IF NOT EXISTS pending_users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    username_key TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL,
+    token TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pending_users_email ON pending_users (email);
+
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    username_key TEXT NOT NULL,
+    disease TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    symptoms TEXT NOT NULL,
+    treatment_pdf_blob TEXT,
+    illness_pdf_blob TEXT
+);
+CREATE INDEX IF NOT EXISTS history_user ON history (username_key, id);
+CREATE INDEX IF NOT EXISTS history_treatment_blob ON history (treatment_pdf_blob);
+CREATE INDEX IF NOT EXISTS history_illness_blob ON history (illness_pdf_blob);
+"""
+
+class SqliteStorage:
+    """Everything in one SQLite database in WAL mode, so readers never block the writer.
+
+    Usernames are matched case-insensitively through the indexed username_key
+    column (username_key(), the same rule the JSON backend uses). Each thread
+    gets its own connection.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _user(row):
+        if row is None:
+            return None
+        return {"username": row['username'], "password": row['password'], "email": row['email'],
+                "is_admin": bool(row['is_admin']), "usage_count": row['usage_count']}
+
+    @staticmethod
+    def _user_row(user):
+        return (user['username'], username_key(user['username']), user['password'], user['email'],
+                int(user.get('is_admin', False)), user.get('usage_count', 0))
+
+    @staticmethod
+    def _illness(row):
+        return {"disease": row['disease'], "timestamp": row['timestamp'], "symptoms": json.loads(row['symptoms']),
+                "treatment_pdf_blob": row['treatment_pdf_blob'], "illness_pdf_blob": row['illness_pdf_blob']}
+
+    @staticmethod
+    def _illness_row(username, illness):
+        return (username, username_key(username), illness['disease'], illness['timestamp'], json.dumps(illness['symptoms']),
+                illness.get('treatment_pdf_blob'), illness.get('illness_pdf_blob'))
+
+    # Users
+    def load_users(self):
+        return [self._user(row) for row in self._connect().execute("SELECT * FROM users ORDER BY id")]
+
+    def save_users(self, users):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM users")
+            conn.executemany("INSERT INTO users (username, username_key, password, email, is_admin, usage_count) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", [self._user_row(u) for u in users])
+
+    def get_user(self, username):
+        return self._user(self._connect().execute("SELECT * FROM users WHERE username_key = ?", (username_key(username),)).fetchone())
+
+    @staticmethod
+    def _exists(conn, table, username, email):
+        row = conn.execute(
+            f"SELECT 1 FROM {table} WHERE username_key = ? UNION ALL SELECT 1 FROM {table} WHERE email = ? LIMIT 1",
+            (username_key(username), email)).fetchone()
+        return row is not None
+
+    def user_exists(self, username, email):
+        return self._exists(self._connect(), 'users', username, email)
+
+    def add_user(self, user):
+        with self._connect() as conn:
+            # Take the write lock before checking, so two sign-ups can't both pass the check.
+            conn.execute("BEGIN IMMEDIATE")
+            if self._exists(conn, 'users', user['username'], user['email']):
+                return False
+            conn.execute("INSERT INTO users (username, username_key, password, email, is_admin, usage_count) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", self._user_row(user))
+        return True
+
+    def update_user(self, username, **fields):
+        with self._connect() as conn:
+            return self._update_user(conn, username, fields)
+
+    def update_profile(self, username, **fields):
+        with self._connect() as conn:
+            # As in add_user: the write lock is taken before the email check, so two users can't both pass it.
+            conn.execute("BEGIN IMMEDIATE")
+            if 'email' in fields and conn.execute("SELECT 1 FROM users WHERE email = ? AND username_key != ? LIMIT 1",
+                                                  (fields['email'], username_key(username))).fetchone():
+                return False
+            return self._update_user(conn, username, fields) or None
+
+    @staticmethod
+    def _update_user(conn, username, fields):
+        unknown = set(fields) - set(USER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown user fields: {sorted(unknown)}")
+        if 'is_admin' in fields:
+            fields['is_admin'] = int(fields['is_admin'])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        cursor = conn.execute(f"UPDATE users SET {assignments} WHERE username_key = ?",
+                              (*fields.values(), username_key(username)))
+        return cursor.rowcount > 0
+
+    def remove_user(self, username):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM users WHERE username_key = ?", (username_key(username),))
+        return cursor.rowcount > 0
+
+    def toggle_admin(self, username):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE users SET is_admin = NOT is_admin WHERE username_key = ?", (username_key(username),))
+            row = conn.execute("SELECT is_admin FROM users WHERE username_key = ?", (username_key(username),)).fetchone()
+        return bool(row['is_admin']) if row else None
+
+    def increment_usage(self, username):
+        with self._connect() as conn:
+            conn.execute("UPDATE users SET usage_count = usage_count + 1 WHERE username_key = ? AND NOT is_admin",
+                         (username_key(username),))
+
+    def reset_all_usage(self):
+        with self._connect() as conn:
+            return conn.execute("UPDATE users SET usage_count = 0 WHERE NOT is_admin").rowcount
+
+    # Pending users
+    def load_pending_users(self):
+        return [dict(row) for row in self._connect().execute(
+            "SELECT username, password, email, token, timestamp FROM pending_users ORDER BY id")]
+
+    def get_pending_user(self, username):
+        row = self._connect().execute("SELECT username, password, email, token, timestamp FROM pending_users "
+                                      "WHERE username_key = ?", (username_key(username),)).fetchone()
+        return dict(row) if row else None
+
+    def pending_exists(self, username, email):
+        return self._exists(self._connect(), 'pending_users', username, email)
+
+    def add_pending_user(self, pending_user):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if self._exists(conn, 'pending_users', pending_user['username'], pending_user['email']):
+                return False
+            conn.execute("INSERT INTO pending_users (username, username_key, password, email, token, timestamp) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         (pending_user['username'], username_key(pending_user['username']), pending_user['password'],
+                          pending_user['email'], pending_user['token'], pending_user['timestamp']))
+        return True
+
+    def remove_pending_user(self, username):
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM pending_users WHERE username_key = ?", (username_key(username),))
+        return cursor.rowcount > 0
+
+    def activate_pending_user(self, username):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT username, password, email FROM pending_users WHERE username_key = ?",
+                               (username_key(username),)).fetchone()
+            if row is None or self._exists(conn, 'users', row['username'], row['email']):
+                return False
+            conn.execute("INSERT INTO users (username, username_key, password, email, is_admin, usage_count) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", self._user_row(activated_user(dict(row))))
+            conn.execute("DELETE FROM pending_users WHERE username_key = ?", (username_key(username),))
+        return True
+
+    # History
+    def load_history(self):
+        users = {}
+        for row in self._connect().execute("SELECT * FROM history ORDER BY id"):
+            users.setdefault(row['username'], []).append(self._illness(row))
+        return [{"username": username, "illnesses": illnesses} for username, illnesses in users.items()]
+
+    def save_history(self, users):
+        with blob_lock():
+            with self._connect() as conn:
+                dropped = self._history_blobs(conn, "") - _blob_digests(users)
+                conn.execute("DELETE FROM history")
+                self._insert_history(conn, users)
+            delete_blobs(dropped)
+
+    @staticmethod
+    def _history_blobs(conn, where, params=()):
+        rows = conn.execute(f"SELECT treatment_pdf_blob, illness_pdf_blob FROM history {where}", params)
+        return {digest for row in rows for digest in row if digest}
+
+    @classmethod
+    def _insert_history(cls, conn, users):
+        conn.executemany("INSERT INTO history (username, username_key, disease, timestamp, symptoms, treatment_pdf_blob, "
+                         "illness_pdf_blob) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (cls._illness_row(u['username'], illness) for u in users for illness in u['illnesses']))
+
+    def add_illness(self, username, illness):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO history (username, username_key, disease, timestamp, symptoms, treatment_pdf_blob, "
+                         "illness_pdf_blob) VALUES (?, ?, ?, ?, ?, ?, ?)", self._illness_row(username, illness))
+
+    def get_illnesses(self, username):
+        # Entries are looked up under the exact username they were saved with, as in the JSON journal.
+        rows = self._connect().execute("SELECT * FROM history WHERE username_key = ? AND username = ? ORDER BY id",
+                                       (username_key(username), username))
+        return [self._illness(row) for row in rows]
+
+    def get_illness_page(self, username, offset, limit):
+        conn = self._connect()
+        params = (username_key(username), username)
+        total = conn.execute("SELECT COUNT(*) FROM history WHERE username_key = ? AND username = ?", params).fetchone()[0]
+        rows = conn.execute("SELECT * FROM history WHERE username_key = ? AND username = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+                            (*params, limit, offset))
+        return [self._illness(row) for row in rows], total
+
+    def delete_history(self, username):
+        """Delete `username`'s entries, then every blob of theirs that no other entry refers to."""
+        key = username_key(username)
+        with blob_lock():
+            with self._connect() as conn:
+                digests = self._history_blobs(conn, "WHERE username_key = ?", (key,))
+                conn.execute("DELETE FROM history WHERE username_key = ?", (key,))
+                unreferenced = {digest for digest in digests if conn.execute(
+                    "SELECT 1 FROM history WHERE treatment_pdf_blob = ? OR illness_pdf_blob = ? LIMIT 1",
+                    (digest, digest)).fetchone() is None}
+            delete_blobs(unreferenced)
+
+    def import_from(self, source):
+        """Replace this database's contents with everything `source` (another backend) holds, in one transaction."""
+        users, pending_users, history = source.load_users(), source.load_pending_users(), source.load_history()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM users")
+            conn.execute("DELETE FROM pending_users")
+            conn.execute("DELETE FROM history")
+            conn.executemany("INSERT INTO users (username, username_key, password, email, is_admin, usage_count) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", [self._user_row(u) for u in users])
+            conn.executemany("INSERT INTO pending_users (username, username_key, password, email, token, timestamp) "
+                             "VALUES (?, ?, ?, ?, ?, ?)",
+                             [(u['username'], username_key(u['username']), u['password'], u['email'], u['token'], u['timestamp'])
+                              for u in pending_users])
+            self._insert_history(conn, history)
+        return len(users), len(pending_users), sum(len(u['illnesses']) for u in history)
+
+@st.cache_resource
+def get_storage():
+    """The process-wide storage backend selected by HEYDOC_STORAGE."""
+    if STORAGE_BACKEND == 'sqlite':
+        return SqliteStorage()
+    if STORAGE_BACKEND == 'json':
+        return JsonStorage()
+    raise ValueError(f"Unknown HEYDOC_STORAGE {STORAGE_BACKEND!r}; expected 'json' or 'sqlite'")
+
+def main():
+    parser = argparse.ArgumentParser(description="HeyDoc storage maintenance")
+    parser.add_argument('command', choices=['import-json', 'migrate-history'])
+    parser.add_argument('--db', default=DB_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'migrate-history':
+        # The legacy import runs once, when the history directory does not exist yet.
+        if os.path.isdir(HISTORY_DIR):
+            print(f"{HISTORY_DIR}/ already exists; nothing to migrate")
+            return
+        history = ShardedHistory(HISTORY_DIR).load()
+        print(f"Migrated {len(history)} users and {sum(len(u['illnesses']) for u in history)} history entries "
+              f"into {HISTORY_DIR}/ in {time.perf_counter() - start:.2f}s")
+        return
+    users, pending_users, illnesses = SqliteStorage(args.db).import_from(JsonStorage())
+    print(f"Imported {users} users, {pending_users} pending users and {illnesses} history entries "
+          f"into {args.db} in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import json
+import os
+import random
+import sys
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The app reads disease_info.json, styles and the logo relative to the working directory,
+# and constants.py loads the catalog at import time, before any fixture runs.
+os.chdir(ROOT)
+
+from ai import FEATURE_COLUMNS, INPUT_GRID, FLAT_FOREST_DIR, LOOKUP_DIR
+
+def random_patients(n, seed=0):
+    """Patient dicts drawn from the same choices predict_disease_ui offers."""
+    rng = random.Random(seed)
+    return [{col: rng.choice(values) for col, values in INPUT_GRID.items()} for _ in range(n)]
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory):
+    """A small forest trained on random patients, saved in every format DiseasePredictor loads."""
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import LabelEncoder
+    from ai import DiseasePredictor, FlatForest, LookupModel
+
+    path = str(tmp_path_factory.mktemp("models"))
+    frame = pd.DataFrame.from_records(random_patients(3000))
+    encoders = {}
+    for col in FEATURE_COLUMNS:
+        if col != 'Age':
+            encoders[col] = LabelEncoder().fit(INPUT_GRID[col] + ['UNKNOWN'])
+            frame[col] = encoders[col].transform(frame[col])
+    with open('disease_info.json', 'r') as file:
+        diseases = list(json.load(file))[:12]
+    label_encoder = LabelEncoder().fit(diseases)
+    # Tie the label to a few inputs so the trees have real structure to learn.
+    rng = np.random.default_rng(0)
+    codes = (frame['Fever'] * 4 + frame['Cough'] * 2 + (frame['Age'] > 50) + rng.integers(0, 3, len(frame))) % len(diseases)
+    model = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0).fit(frame[FEATURE_COLUMNS], codes)
+
+    joblib.dump(model, os.path.join(path, 'disease_predictor.joblib'))
+    joblib.dump(encoders, os.path.join(path, 'feature_encoders.joblib'))
+    joblib.dump(label_encoder, os.path.join(path, 'label_encoder_y.joblib'))
+    FlatForest.save(model, os.path.join(path, FLAT_FOREST_DIR))
+    LookupModel.save(DiseasePredictor(path, 'joblib'), os.path.join(path, LOOKUP_DIR))
+    return path
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+import ai
+from ai import DiseasePredictor, FlatForest
+from conftest import random_patients
+
+PATIENTS = random_patients(400, seed=1)
+
+@pytest.fixture(scope="module")
+def predictors(model_dir):
+    """One predictor per prediction path: joblib, mmap, lookup and joblib with the precomputed table."""
+    predictors = {model_format: DiseasePredictor(model_dir, model_format) for model_format in ("joblib", "mmap", "lookup")}
+    predictors["precomputed"] = DiseasePredictor(model_dir, "joblib")
+    predictors["precomputed"].precompute()
+    return predictors
+
+def test_predictor_is_loaded_once_and_shared(model_dir, monkeypatch):
+    loads = []
+    monkeypatch.setattr(ai, "DiseasePredictor", lambda: loads.append(1) or DiseasePredictor(model_dir, "joblib"))
+    ai.get_predictor.clear()
+    try:
+        predictor = ai.get_predictor()
+        assert ai.get_predictor() is predictor and len(loads) == 1
+        assert ai.reload_predictor() is not predictor and len(loads) == 2
+    finally:
+        ai.get_predictor.clear()
+
+def test_single_row_matches_sklearn(predictors):
+    import pandas as pd
+    predictor = predictors["joblib"]
+    frame = predictor.encoder.encode_frame(pd.DataFrame.from_records(PATIENTS))
+    expected = predictor.label_encoder_y.inverse_transform(predictor.model.predict(frame)).tolist()
+    assert [predictor.predict_disease(patient) for patient in PATIENTS] == expected
+
+@pytest.mark.parametrize("path", ["mmap", "lookup", "precomputed"])
+def test_prediction_paths_agree(predictors, path):
+    expected = [predictors["joblib"].predict_disease(patient) for patient in PATIENTS]
+    assert [predictors[path].predict_disease(patient) for patient in PATIENTS] == expected
+    assert predictors[path].predict_many(PATIENTS) == expected
+
+def test_mmap_forest_maps_its_arrays(predictors):
+    forest = predictors["mmap"].model
+    assert all(isinstance(getattr(forest, name), np.memmap) for name in FlatForest.ARRAYS)
+
+def test_predict_many_takes_frames(predictors):
+    import pandas as pd
+    predictor = predictors["joblib"]
+    assert predictor.predict_many(pd.DataFrame.from_records(PATIENTS[:20])) == predictor.predict_many(PATIENTS[:20])
+    assert predictor.predict_many([]) == []
+
+def test_repeat_predictions_come_from_the_cache(model_dir):
+    predictor = DiseasePredictor(model_dir, "joblib")
+    first = [predictor.predict_disease(patient) for patient in PATIENTS]
+    before = predictor.cache_stats()
+    assert [predictor.predict_disease(patient) for patient in PATIENTS] == first
+    after = predictor.cache_stats()
+    assert after["misses"] == before["misses"] and after["hits"] - before["hits"] == len(PATIENTS)
+
+def test_precomputed_table_answers_grid_inputs(predictors):
+    predictor = predictors["precomputed"]
+    hits = predictor.table_hits
+    for patient in PATIENTS:
+        predictor.predict_disease(patient)
+    assert predictor.table_hits - hits == len(PATIENTS)
+
+@pytest.mark.parametrize("path", ["mmap", "lookup", "precomputed"])
+def test_topk_paths_agree(predictors, path):
+    for patient in PATIENTS:
+        expected = predictors["joblib"].predict_topk(patient, 5)
+        topk = predictors[path].predict_topk(patient, 5)
+        assert [disease for disease, _ in topk] == [disease for disease, _ in expected]
+        np.testing.assert_allclose([p for _, p in topk], [p for _, p in expected], rtol=1e-6)
+
+def test_topk_starts_with_prediction(predictors):
+    for predictor in predictors.values():
+        for patient in PATIENTS[:50]:
+            topk = predictor.predict_topk(patient, 3)
+            assert topk[0][0] == predictor.predict_disease(patient)
+            assert [p for _, p in topk] == sorted((p for _, p in topk), reverse=True)
+
+def test_precomputed_table_serves_the_differential(predictors):
+    predictor = predictors["precomputed"]
+    misses = predictor.cache_stats()["misses"]
+    for patient in PATIENTS:
+        key = predictor.encode(patient)
+        [(column, _)] = predictor.table.topk(key, 1)
+        assert predictor.class_labels[column] == predictor.predict_encoded(key) == predictors["joblib"].predict_encoded(key)
+        predictor.predict_topk_encoded(key, 5)
+    assert predictor.cache_stats()["misses"] == misses  # the model never ran
+    # Keys off the grid, and differentials longer than the table keeps, still go to the model.
+    off_grid = predictor.encode(dict(PATIENTS[0], Age=19))
+    assert predictor.predict_topk_encoded(off_grid, 5) == predictors["joblib"].predict_topk_encoded(off_grid, 5)
+    key = predictor.encode(PATIENTS[0])
+    assert predictor.predict_topk_encoded(key, 8) == predictors["joblib"].predict_topk_encoded(key, 8)
+
+def test_lookup_rejects_inputs_outside_grid(predictors):
+    patient = dict(PATIENTS[0], Age=19)
+    assert predictors["joblib"].predict_disease(patient)
+    with pytest.raises(ValueError, match="outside the lookup grid"):
+        predictors["lookup"].predict_disease(patient)
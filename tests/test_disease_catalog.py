@@ -0,0 +1,63 @@
+import json
+import os
+from html import escape
+import pytest
+from disease_catalog import DiseaseCatalog, build, load_catalog
+
+@pytest.fixture(scope="module")
+def info():
+    with open('disease_info.json', 'r') as file:
+        return json.load(file)
+
+def test_catalog_reproduces_disease_info(info):
+    catalog = DiseaseCatalog(info)
+    assert catalog.names == list(info)
+    assert catalog.info == info
+
+def test_artifact_round_trip(info, tmp_path):
+    artifact = str(tmp_path / "disease_info.compiled.json")
+    build('disease_info.json', artifact)
+    with open(artifact, 'r', encoding='utf-8') as file:
+        assert json.load(file)["source_stat"]  # plain JSON, not a pickle
+    catalog = load_catalog('disease_info.json', artifact)
+    assert catalog.info == info
+    # Without the source the artifact is used as is.
+    assert load_catalog(str(tmp_path / "missing.json"), artifact).info == info
+    for name, sections in info.items():
+        for key, items in sections.items():
+            assert catalog.markdown(name, key) == "\n".join(f"- {item}" for item in items)
+    assert catalog.html("Asthma", "treatment") == "".join(
+        f'<div class="remedy-item">{escape(item, quote=False)}</div>' for item in info["Asthma"]["treatment"])
+
+def test_stale_artifact_is_ignored(info, tmp_path):
+    source, artifact = tmp_path / "disease_info.json", str(tmp_path / "disease_info.compiled.json")
+    source.write_text(json.dumps({"Asthma": info["Asthma"]}))
+    build(str(source), artifact)
+    assert load_catalog(str(source), artifact).names == ["Asthma"]
+    source.write_text(json.dumps(info))
+    assert load_catalog(str(source), artifact).info == info
+
+def test_up_to_date_artifact_is_used_without_reading_the_source(info, tmp_path):
+    source, artifact = tmp_path / "disease_info.json", str(tmp_path / "disease_info.compiled.json")
+    source.write_text(json.dumps({"Asthma": info["Asthma"]}))
+    build(str(source), artifact)
+    stat = os.stat(source)
+    # Same size and mtime: the artifact is trusted, so the source's new contents go unread.
+    source.write_text(json.dumps({"Asthma": info["Asthma"]}).replace("Asthma", "Xsthma", 1))
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_catalog(str(source), artifact).names == ["Asthma"]
+    # A rewrite that keeps the size but moves the mtime is seen.
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_catalog(str(source), artifact).names == ["Xsthma"]
+
+def test_loading_writes_nothing(tmp_path):
+    artifact = tmp_path / "disease_info.compiled.json"
+    assert len(load_catalog('disease_info.json', str(artifact))) > 0
+    assert not artifact.exists()
+
+def test_names_resolve_loosely(info):
+    catalog = DiseaseCatalog(info)
+    assert catalog.resolve("alzheimer's  DISEASE") == "Alzheimer’s Disease"
+    assert catalog.get("hiv/aids") == info["HIV/AIDS"]
+    assert "Not A Disease" not in catalog
+    assert catalog.markdown("Not A Disease", "symptoms") == ""
@@ -0,0 +1,58 @@
+import pytest
+from disease_catalog import DiseaseCatalog
+from disease_search import SearchIndex, stem, tokenize
+from constants import DISEASE_CATALOG
+
+CATALOG = DiseaseCatalog({
+    "Bronchitis": {
+        "definition": ["Inflammation of the bronchial tubes."],
+        "symptoms": ["Persistent cough", "Coughing up mucus", "Chest discomfort"],
+        "causes": ["Viral infection"],
+        "risk_factors": ["Smoking"],
+    },
+    "Common Cold": {
+        "definition": ["A viral infection of the nose and throat."],
+        "symptoms": ["Runny nose", "Sore throat", "Cough", "Mild fever", "Sneezing", "Headache"],
+        "causes": ["Rhinoviruses"],
+        "risk_factors": ["Winter months"],
+    },
+    "Migraine": {
+        "definition": ["A headache disorder with recurrent attacks."],
+        "symptoms": ["Throbbing headache", "Nausea", "Sensitivity to light"],
+        "causes": ["Genetic factors"],
+        "risk_factors": ["Stress", "Caffeine withdrawal"],
+    },
+})
+
+@pytest.fixture(scope="module")
+def index():
+    return SearchIndex(CATALOG)
+
+def test_stemmer_joins_word_forms():
+    assert stem("coughing") == stem("coughs") == stem("cough")
+    assert tokenize("The patient's coughing, and sneezing") == ["patient", "cough", "sneez"]
+
+def test_ranking(index):
+    # Bronchitis has "cough" twice in a shorter symptom list than Common Cold's one mention.
+    assert [hit["disease"] for hit in index.search("coughing")] == ["Bronchitis", "Common Cold"]
+    # A name match outweighs symptom matches.
+    assert index.search("cold headache")[0]["disease"] == "Common Cold"
+    assert index.search("throbbing headache")[0]["disease"] == "Migraine"
+
+def test_fields_and_matches(index):
+    assert index.search("stress", fields=["symptoms", "causes"]) == []
+    hits = index.search("stress", fields=["risk_factors"])
+    assert [hit["disease"] for hit in hits] == ["Migraine"]
+    assert hits[0]["matches"] == {"risk_factors": ["Stress"]}
+    assert index.search("cough", limit=1)[0]["matches"]["symptoms"] == ["Persistent cough", "Coughing up mucus"]
+
+def test_no_terms_no_hits(index):
+    assert index.search("") == []
+    assert index.search("the and of") == []
+    assert index.search("xylophone") == []
+
+def test_disease_names_find_themselves():
+    index = SearchIndex(DISEASE_CATALOG)
+    for name in DISEASE_CATALOG.names:
+        hits = index.search(name, fields=["name"])
+        assert name in [hit["disease"] for hit in hits[:2]], name
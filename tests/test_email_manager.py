@@ -0,0 +1,177 @@
+import json
+import os
+import socket
+import time
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+import email_manager
+from email_manager import Outbox, SMTPPool, build_confirmation_email, smtp_settings
+from storage import atomic_write_json
+
+class Relay:
+    """An aiosmtpd handler that keeps what it receives and can turn away the next few messages."""
+    def __init__(self):
+        self.messages = []
+        self.refuse = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.refuse:
+            self.refuse -= 1
+            return '451 4.3.0 Try again later'
+        self.messages.append(envelope)
+        return '250 OK'
+
+@pytest.fixture
+def relay(monkeypatch):
+    """A local SMTP stand-in that accepts any login without TLS, with the SMTP_* settings pointing at it."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    handler = Relay()
+
+    def start():
+        handler.controller = Controller(handler, hostname='127.0.0.1', port=port, auth_require_tls=False,
+                                        authenticator=lambda *args: AuthResult(success=True))
+        handler.controller.start()
+
+    def restart():
+        """Drop every open connection, as a relay does to idle clients."""
+        handler.controller.stop()
+        start()
+
+    start()
+    handler.restart = restart
+    for name, value in {"SMTP_SERVER": "127.0.0.1", "SMTP_PORT": str(port), "SMTP_STARTTLS": "0",
+                        "SENDER_EMAIL": "heydoc@example.com", "SENDER_PASSWORD": "secret"}.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(email_manager, "SMTP_POOL_SIZE", 0)
+    yield handler
+    handler.controller.stop()
+
+def queue_confirmation(outbox, username="alice"):
+    msg = build_confirmation_email("heydoc@example.com", f"{username}@example.com", username, "token123")
+    outbox.put(msg, "confirmation email")
+    [name] = outbox.pending()
+    return name
+
+def read_entry(outbox, name):
+    with open(os.path.join(outbox.directory, name), 'r') as file:
+        return json.load(file)
+
+def test_outbox_delivers(relay, tmp_path):
+    outbox = Outbox(str(tmp_path))
+    queue_confirmation(outbox)
+    assert outbox.process_due() == 1
+    [envelope] = relay.messages
+    assert envelope.rcpt_tos == ["alice@example.com"]
+    assert b"Subject: HeyDoc Account Confirmation" in envelope.content
+    assert outbox.pending() == [] and os.listdir(outbox.sending_dir) == []
+
+def test_failed_send_is_retried_with_backoff(relay, tmp_path, monkeypatch):
+    monkeypatch.setattr(email_manager, "OUTBOX_BACKOFF", 30)
+    outbox = Outbox(str(tmp_path))
+    name = queue_confirmation(outbox)
+    relay.refuse = 2
+
+    for attempts, delay in [(1, 30), (2, 60)]:
+        before = time.time()
+        assert outbox.process_due() == 0
+        entry = read_entry(outbox, name)
+        assert entry["attempts"] == attempts
+        assert before + delay <= entry["next_attempt"] <= time.time() + delay
+        # Not due yet: the next pass leaves it alone.
+        assert outbox.process_due() == 0
+        assert read_entry(outbox, name)["attempts"] == attempts
+        atomic_write_json(os.path.join(outbox.directory, name), dict(entry, next_attempt=0))
+
+    assert outbox.process_due() == 1
+    assert len(relay.messages) == 1 and outbox.pending() == []
+
+def test_message_is_parked_after_max_attempts(relay, tmp_path, monkeypatch):
+    monkeypatch.setattr(email_manager, "OUTBOX_MAX_ATTEMPTS", 1)
+    outbox = Outbox(str(tmp_path))
+    name = queue_confirmation(outbox)
+    relay.refuse = 1
+    assert outbox.process_due() == 0
+    assert outbox.pending() == [] and outbox.failed() == [name]
+
+def test_stale_claim_is_reclaimed(relay, tmp_path):
+    outbox = Outbox(str(tmp_path))
+    name = queue_confirmation(outbox)
+    # A worker is sending the message: its claim is left alone.
+    path, fd = outbox._claim(name)
+    assert outbox.process_due() == 0 and relay.messages == []
+    assert os.listdir(outbox.sending_dir) == [name]
+    # The worker dies without finishing: its lock goes with it and the next pass sends the message.
+    os.close(fd)
+    assert outbox.process_due() == 1
+    assert len(relay.messages) == 1
+    assert outbox.pending() == [] and os.listdir(outbox.sending_dir) == []
+
+def test_claim_without_lock_support_times_out(relay, tmp_path, monkeypatch):
+    monkeypatch.setattr(email_manager, "fcntl", None)
+    outbox = Outbox(str(tmp_path))
+    name = queue_confirmation(outbox)
+    path, fd = outbox._claim(name)
+    os.close(fd)
+    assert outbox.process_due() == 0
+    stale = time.time() - email_manager.OUTBOX_CLAIM_TIMEOUT - 1
+    os.utime(path, (stale, stale))
+    assert outbox.process_due() == 1 and len(relay.messages) == 1
+
+def test_worker_sends_what_a_previous_process_left(relay, tmp_path):
+    previous = Outbox(str(tmp_path))
+    queue_confirmation(previous, "alice")
+    name = queue_confirmation(Outbox(str(tmp_path / "other")), "bob")
+    # bob's message was claimed by a worker that crashed mid-send.
+    os.makedirs(previous.sending_dir, exist_ok=True)
+    os.rename(os.path.join(tmp_path / "other", name), os.path.join(previous.sending_dir, name))
+
+    stop = Outbox(str(tmp_path)).start()
+    try:
+        deadline = time.monotonic() + 30
+        while len(relay.messages) < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+    assert sorted(envelope.rcpt_tos[0] for envelope in relay.messages) == ["alice@example.com", "bob@example.com"]
+    assert previous.pending() == [] and os.listdir(previous.sending_dir) == []
+
+def idle_pool(size):
+    """A pool holding `size` logged-in idle connections."""
+    pool = SMTPPool(smtp_settings(), size, max_messages=100)
+    connections = [pool.connection() for _ in range(size)]
+    for connection in connections:
+        connection.__enter__()
+    for connection in connections:
+        connection.__exit__(None, None, None)
+    assert len(pool._idle) == size and pool.connections_opened == size
+    return pool
+
+def test_pool_replaces_a_connection_that_fails_noop(relay, monkeypatch):
+    monkeypatch.setattr(email_manager, "SMTP_NOOP_AFTER", 0)
+    pool = idle_pool(2)
+    relay.restart()
+    noops = []
+    for server, _, _ in pool._idle:
+        monkeypatch.setattr(server, "noop", lambda server=server: noops.append(server) or type(server).noop(server))
+
+    pool.send(build_confirmation_email("heydoc@example.com", "alice@example.com", "alice", "t"))
+    assert len(relay.messages) == 1
+    # The second idle connection is no fresher than the one that failed, so it isn't tried.
+    assert len(noops) == 1 and pool.connections_opened == 3
+
+def test_pool_retries_a_dropped_send_on_a_new_connection(relay):
+    pool = idle_pool(2)
+    relay.restart()
+    pool.send(build_confirmation_email("heydoc@example.com", "alice@example.com", "alice", "t"))
+    assert len(relay.messages) == 1 and pool.connections_opened == 3
+
+def test_pool_counts_every_connection_it_opens(relay):
+    from concurrent.futures import ThreadPoolExecutor
+    pool = SMTPPool(smtp_settings(), 8, max_messages=1)
+    msg = build_confirmation_email("heydoc@example.com", "alice@example.com", "alice", "t")
+    with ThreadPoolExecutor(max_workers=8) as senders:
+        list(senders.map(lambda _: pool.send(msg), range(40)))
+    assert len(relay.messages) == 40 and pool.connections_opened == 40
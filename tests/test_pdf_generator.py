@@ -0,0 +1,81 @@
+from io import BytesIO
+import json
+from xml.sax.saxutils import escape
+import pytest
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Image, Paragraph
+from constants import DISEASE_CATALOG
+import pdf_generator
+from pdf_generator import ILLNESS_REPORT, LOGO_PATH, STYLES, TREATMENT_REPORT, ReportTemplate, StampablePdf
+
+def page_texts(pdf):
+    return [page.extract_text() for page in PdfReader(BytesIO(pdf), strict=True).pages]
+
+def resolve_all(obj, seen):
+    """Follow every indirect reference under `obj`; a reference to a missing object raises."""
+    if isinstance(obj, IndirectObject):
+        if (obj.idnum, obj.generation) in seen:
+            return
+        seen.add((obj.idnum, obj.generation))
+        target = obj.get_object()
+        assert target is not None, f"dangling reference {obj.idnum} {obj.generation} R"
+        obj = target
+    if isinstance(obj, DictionaryObject):
+        for key in obj:
+            if key != '/Parent':
+                resolve_all(obj.raw_get(key), seen)
+    elif isinstance(obj, ArrayObject):
+        for item in obj:
+            resolve_all(item, seen)
+
+class BrandedReport(ReportTemplate):
+    """A header in an embedded TrueType font with an image: objects the stamp must carry over and renumber."""
+    def header(self, username):
+        style = ParagraphStyle('Branded', parent=STYLES["body"], fontName='Vera')
+        return [Paragraph(f"Generated for: {escape(username)}", style), Image(LOGO_PATH, width=36, height=36)]
+
+@pytest.mark.parametrize("template", [TREATMENT_REPORT, ILLNESS_REPORT], ids=["treatment", "illness"])
+@pytest.mark.parametrize("disease", ["Asthma", "Alzheimer’s Disease", "Hypertension"])
+def test_stamp_matches_full_render(template, disease):
+    disease_data = DISEASE_CATALOG.get(disease)
+    stamped = template.stamp(disease, disease_data, "Dr. <Who> & co").getvalue()
+    texts = page_texts(stamped)
+    assert "Generated for: Dr. <Who> & co" in texts[0]
+    assert texts == page_texts(template.render(disease, disease_data, "Dr. <Who> & co").getvalue())
+    body, _ = template._cached_body(disease, json.dumps(disease_data, sort_keys=True))
+    assert stamped.startswith(body.pdf)
+
+def test_stamp_carries_embedded_fonts_and_images():
+    pdfmetrics.registerFont(TTFont('Vera', 'Vera.ttf'))
+    template = BrandedReport("Branded Report", "Condition", [("symptoms", "Common Symptoms")])
+    disease_data = DISEASE_CATALOG.get("Asthma")
+    stamped = template.stamp("Asthma", disease_data, "bob").getvalue()
+    assert page_texts(stamped) == page_texts(template.render("Asthma", disease_data, "bob").getvalue())
+
+    reader = PdfReader(BytesIO(stamped), strict=True)
+    resolve_all(reader.trailer.raw_get('/Root'), set())
+    header = reader.pages[0]['/Resources']['/XObject'][StampablePdf.FORM_NAME]
+    resources = header['/Resources']
+    [font] = [f for f in resources['/Font'].values() if f.get('/Subtype') == '/TrueType']
+    font_file = font['/FontDescriptor']['/FontFile2']
+    assert font_file.get_data()[:4] == b'\x00\x01\x00\x00'  # a TrueType font program, not whatever object had its old number
+    assert any(x['/Subtype'] == '/Image' for x in resources['/XObject'].values())
+
+def test_reports_are_rendered_once_per_run(monkeypatch):
+    import streamlit as st
+    import main
+    renders = []
+    render = pdf_generator.render_reports
+    monkeypatch.setattr(pdf_generator, "render_reports", lambda *args: renders.append(args) or render(*args))
+    try:
+        treatment, illness = main.get_diagnosis_reports("Asthma", "bob", 1.0)
+        assert "Generated for: bob" in page_texts(treatment)[0] and illness.startswith(b"%PDF")
+        assert main.get_diagnosis_reports("Asthma", "bob", 1.0) == (treatment, illness)
+        main.get_diagnosis_reports("Asthma", "bob", 2.0)
+        assert len(renders) == 2
+    finally:
+        st.session_state.pop('report_cache', None)
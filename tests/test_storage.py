@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import pytest
+import storage
+from storage import HistoryJournal, ShardedHistory
+
+def illness(n):
+    return {"disease": f"Disease {n}", "timestamp": f"2025-01-01 00:00:{n % 60:02d}", "symptoms": ["Fever"],
+            "treatment_pdf_blob": f"{n:064x}", "illness_pdf_blob": f"{n + 1:064x}"}
+
+@pytest.fixture
+def history(tmp_path):
+    directory = tmp_path / "user_history"
+    directory.mkdir()
+    return ShardedHistory(str(directory))
+
+def test_sharded_history_keeps_every_entry(history):
+    for n in range(30):
+        history.add(["alice", "Alice", "bob"][n % 3], illness(n))
+    assert history.get("alice") == [illness(n) for n in range(0, 30, 3)]
+    assert history.get("Alice") == [illness(n) for n in range(1, 30, 3)]
+    entries, total = history.page("bob", 2, 3)
+    assert total == 10 and entries == [illness(n) for n in (23, 20, 17)]
+    assert len(os.listdir(history.directory)) == 2  # alice and Alice share a shard
+
+    snapshot = history.load()
+    history.save(snapshot)
+    assert ShardedHistory(history.directory).load() == snapshot
+    history.delete("ALICE")
+    assert history.get("alice") == history.get("Alice") == []
+    assert history.get("bob") == [illness(n) for n in range(2, 30, 3)]
+
+def test_concurrent_appends_lose_nothing(history):
+    def write(worker):
+        for n in range(50):
+            history.add(f"user{worker % 2}", illness(worker * 100 + n))
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # A fresh instance reads only what reached the files.
+    reread = ShardedHistory(history.directory)
+    for user in ("user0", "user1"):
+        entries = reread.get(user)
+        expected = {illness(w * 100 + n)["disease"] for w in range(int(user[-1]), 6, 2) for n in range(50)}
+        assert len(entries) == 150 and {e["disease"] for e in entries} == expected
+
+def test_compaction_drops_only_dead_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "COMPACT_MIN_RECORDS", 20)
+    path = str(tmp_path / "journal.jsonl")
+    journal = HistoryJournal(path)
+    for n in range(15):
+        journal.append({"op": "add", "username": "old", "illness": illness(n)})
+    journal.append({"op": "delete", "username": "OLD"})
+    for n in range(15, 20):
+        journal.append({"op": "add", "username": "kept", "illness": illness(n)})
+    # Reaching 20 records with only 4 of them live compacted the journal down to the live entries.
+    with open(path, 'r') as file:
+        lines = [json.loads(line) for line in file]
+    assert lines[0]["op"] == "header"
+    assert lines[1:] == [{"op": "add", "username": "kept", "illness": illness(n)} for n in range(15, 20)]
+    assert journal.get("kept") == [illness(n) for n in range(15, 20)] and journal.get("old") == []
+
+def test_compaction_under_concurrent_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "COMPACT_MIN_RECORDS", 10)
+    path = str(tmp_path / "journal.jsonl")
+    # Separate instances stand in for separate processes: each has its own index and offset.
+    writers = [HistoryJournal(path) for _ in range(4)]
+
+    def write(worker):
+        journal = writers[worker]
+        for n in range(60):
+            journal.append({"op": "add", "username": f"user{worker}", "illness": illness(worker * 1000 + n)})
+            if n % 10 == 9:
+                journal.append({"op": "add", "username": f"scratch{worker}", "illness": illness(n)})
+                journal.append({"op": "delete", "username": f"scratch{worker}"})
+                journal.compact()
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(len(writers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    journal = HistoryJournal(path)
+    journal.refresh()
+    for worker in range(len(writers)):
+        assert journal.get(f"user{worker}") == [illness(worker * 1000 + n) for n in range(60)]
+        assert journal.get(f"scratch{worker}") == []
+    assert journal.live == 240
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_legacy_history_is_migrated(tmp_path, monkeypatch):
+    import base64
+    from blob_store import get_blob
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "HISTORY_JOURNAL", "user_history.jsonl")
+    monkeypatch.setattr(storage, "LEGACY_HISTORY_FILE", "user_history.json")
+    legacy = {"disease": "Asthma", "timestamp": "2024-05-01 10:00:00", "symptoms": ["Cough"],
+              "treatment_pdf": base64.b64encode(b"%PDF treatment").decode(), "illness_pdf": base64.b64encode(b"%PDF illness").decode()}
+    with open("user_history.json", "w") as file:
+        json.dump({"users": [{"username": "Alice", "illnesses": [legacy]}, {"username": "bob", "illnesses": []}]}, file)
+
+    history = ShardedHistory("user_history")
+    [entry] = history.get("Alice")
+    assert get_blob(entry["treatment_pdf_blob"]) == b"%PDF treatment"
+    assert get_blob(entry["illness_pdf_blob"]) == b"%PDF illness"
+    assert {k: v for k, v in entry.items() if not k.endswith("_blob")} == {k: legacy[k] for k in ("disease", "timestamp", "symptoms")}
+
+def make_storage(backend, history_dir):
+    """A backend over the working directory's users.json and pending_users.json, or heydoc.db."""
+    if backend == "sqlite":
+        return storage.SqliteStorage("heydoc.db")
+    return storage.JsonStorage(history_dir)
+
+def account(username, **fields):
+    return {"username": username, "password": "pw", "email": f"{username}@example.com", "is_admin": False,
+            "usage_count": 0, **fields}
+
+def stored_blobs():
+    import blob_store
+    return {shard + name for shard in os.listdir(blob_store.BLOB_DIR) if shard != '.lock'
+            for name in os.listdir(os.path.join(blob_store.BLOB_DIR, shard))}
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_deleting_history_leaves_no_orphaned_blobs(backend, tmp_path, monkeypatch):
+    import blob_store
+    from blob_store import put_blob
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(blob_store, "BLOB_DIR", str(tmp_path / "blobs"))
+    users = make_storage(backend, "user_history")
+    shared = put_blob(b"%PDF shared")
+    for username in ("alice", "Alice", "bob"):
+        users.add_illness(username, dict(illness(0), treatment_pdf_blob=put_blob(f"%PDF {username}".encode()),
+                                         illness_pdf_blob=shared))
+    [bobs] = users.get_illnesses("bob")
+
+    users.delete_history("ALICE")
+    assert users.get_illnesses("alice") == [] and users.get_illnesses("Alice") == []
+    # bob's entry still uses the shared blob.
+    assert stored_blobs() == {bobs["treatment_pdf_blob"], shared}
+    users.delete_history("bob")
+    assert stored_blobs() == set()
+
+def _concurrent_writer(args):
+    """Process worker for test_concurrent_writers_lose_nothing: every kind of user write, racing the other workers."""
+    backend, directory, worker, count = args
+    os.chdir(directory)
+    users = make_storage(backend, "user_history")
+    activated, promoted, claimed = 0, 0, 0
+    for i in range(count):
+        users.increment_usage("shared")
+        promoted += users.toggle_admin("flipper")
+        users.add_user(account(f"w{worker}-{i}"))
+        users.add_pending_user(dict(account(f"p{worker}-{i}"), token="t", timestamp="2025-01-01 00:00:00"))
+        # Every worker also tries to activate the sign-ups its neighbour just made.
+        activated += users.activate_pending_user(f"p{worker}-{i}")
+        activated += users.activate_pending_user(f"p{(worker + 1) % 4}-{i}")
+        # And every worker tries to move its new account to the same email.
+        claimed += bool(users.update_profile(f"w{worker}-{i}", email=f"claimed{i}@example.com"))
+    return activated, promoted, claimed
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_writers_lose_nothing(backend, tmp_path, monkeypatch):
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    monkeypatch.chdir(tmp_path)
+    users = make_storage(backend, "user_history")
+    users.save_users([account("shared"), account("flipper")])
+    workers, count = 4, 20
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        activated, promoted, claimed = map(sum, zip(*pool.map(_concurrent_writer, [(backend, str(tmp_path), w, count) for w in range(workers)])))
+
+    users = make_storage(backend, "user_history")
+    assert users.get_user("shared")["usage_count"] == workers * count
+    # Serialised flips alternate, so exactly half of them promote and the last one demotes.
+    assert promoted == workers * count // 2
+    assert users.get_user("flipper")["is_admin"] is False
+    assert activated == workers * count  # each sign-up activated exactly once
+    assert users.load_pending_users() == []
+    assert claimed == count
+    emails = [user["email"] for user in users.load_users()]
+    assert all(emails.count(f"claimed{i}@example.com") == 1 for i in range(count))
+    names = {user["username"] for user in users.load_users()}
+    for w in range(workers):
+        for i in range(count):
+            assert {f"w{w}-{i}", f"p{w}-{i}"} <= names
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(('.users.json.', '.pending_users.json.'))]
+
+def test_replacement_with_same_size_and_mtime_is_seen(tmp_path):
+    path = str(tmp_path / "users.json")
+    storage.atomic_write_json(path, {"users": [account("alice", usage_count=1)]})
+    reader, writer = storage.IndexedJsonFile(path, 'users'), storage.IndexedJsonFile(path, 'users')
+    assert reader.get("alice")["usage_count"] == 1
+    _, size, mtime = reader._signature
+    for n in range(2, 10, 2):
+        # Two saves between reads: the second may get the number of the inode the reader last saw.
+        for count in (n, n + 1):
+            writer.update("alice", lambda user: {**user, "usage_count": count})
+            # Within one timestamp tick, with only the inode number to tell the files apart.
+            os.utime(path, ns=(mtime, mtime))
+        assert os.path.getsize(path) == size
+        assert reader.get("alice")["usage_count"] == n + 1
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_toggle_and_activate(backend, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    users = make_storage(backend, "user_history")
+    users.save_users([account("Alice"), account("taken")])
+    assert users.toggle_admin("alice") is True
+    assert users.get_user("Alice")["is_admin"] is True
+    assert users.toggle_admin("ALICE") is False
+    assert users.toggle_admin("nobody") is None
+
+    for name, email in [("Bob", "bob@example.com"), ("carol", "taken@example.com")]:
+        users.add_pending_user({"username": name, "password": "pw", "email": email, "token": "t", "timestamp": "2025-01-01 00:00:00"})
+    assert users.activate_pending_user("bob") is True
+    assert users.get_user("bob") == dict(account("Bob"), email="bob@example.com")
+    assert users.activate_pending_user("bob") is False
+    # The email is in use by now: the sign-up stays pending.
+    assert users.activate_pending_user("carol") is False
+    assert [p["username"] for p in users.load_pending_users()] == ["carol"]